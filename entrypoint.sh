@@ -9,5 +9,18 @@ python manage.py migrate
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
-echo "Starting Django development server..."
-python manage.py runserver 0.0.0.0:8000
\ No newline at end of file
+# APP_SERVER picks the server; tuning lives in portfolio/gunicorn.conf.py
+case "${APP_SERVER:-wsgi}" in
+  dev)
+    echo "Starting Django development server..."
+    exec python manage.py runserver 0.0.0.0:8000
+    ;;
+  asgi)
+    echo "Starting gunicorn with uvicorn workers (ASGI)..."
+    exec gunicorn portfolio.asgi:application -c portfolio/gunicorn.conf.py
+    ;;
+  *)
+    echo "Starting gunicorn (WSGI)..."
+    exec gunicorn portfolio.wsgi:application -c portfolio/gunicorn.conf.py
+    ;;
+esac
@@ -3,10 +3,15 @@ from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
+from django.core.exceptions import PermissionDenied
 from django.db.models import Count, Avg
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from . import revenue
 from .models import (
     Category, Technology, Project, BlogPost, Tag, 
-    CoffeePurchase, SiteSettings, TimeStampedModel
+    CoffeePurchase, NewsletterDelivery, PageView, SiteSettings, TimeStampedModel
 )
 
 
@@ -52,12 +57,12 @@ class TechnologyInline(admin.TabularInline):
 
 @admin.register(Category)
 class CategoryAdmin(TimeStampedAdmin):
-    list_display = ('name', 'color_preview', 'icon_preview', 'project_count', 'blog_count', 'created_at')
+    list_display = ('name', 'color_preview', 'icon_preview', 'project_count', 'post_count', 'created_at')
     list_display_links = ('name',)
     list_filter = ('created_at', 'updated_at')
     search_fields = ('name', 'description')
     prepopulated_fields = {'slug': ('name',)}
-    readonly_fields = ('created_at', 'updated_at', 'project_count', 'blog_count')
+    readonly_fields = ('created_at', 'updated_at', 'project_count', 'post_count')
     fieldsets = (
         (_('Basic Information'), {
             'fields': ('name', 'slug', 'description')
@@ -70,27 +75,11 @@ class CategoryAdmin(TimeStampedAdmin):
             'classes': ('collapse',)
         }),
         (_('Statistics'), {
-            'fields': ('project_count', 'blog_count'),
+            'fields': ('project_count', 'post_count'),
             'classes': ('collapse',)
         })
     )
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(
-            projects_count=Count('projects'),
-            posts_count=Count('blog_posts')
-        )
-
-    def project_count(self, obj):
-        return obj.projects_count
-    project_count.short_description = _('Projects')
-    project_count.admin_order_field = 'projects_count'
-
-    def blog_count(self, obj):
-        return obj.posts_count
-    blog_count.short_description = _('Blog Posts')
-    blog_count.admin_order_field = 'posts_count'
-
     def color_preview(self, obj):
         if obj.color:
             return format_html(
@@ -128,16 +117,6 @@ class TechnologyAdmin(TimeStampedAdmin):
         })
     )
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(
-            projects_count=Count('projects')
-        )
-
-    def project_count(self, obj):
-        return obj.projects_count
-    project_count.short_description = _('Projects')
-    project_count.admin_order_field = 'projects_count'
-
     def website_link(self, obj):
         if obj.website:
             return format_html('<a href="{}" target="_blank">🔗 Website</a>', obj.website)
@@ -225,7 +204,7 @@ class BlogPostAdmin(TimeStampedAdmin):
     prepopulated_fields = {'slug': ('title',)}
     readonly_fields = (
         'created_at', 'updated_at', 'published_at', 'view_count',
-        'estimated_reading_time', 'is_published_display'
+        'word_count', 'reading_time', 'is_published_display'
     )
     filter_horizontal = ('categories', 'tags', 'related_projects')
     date_hierarchy = 'published_at'
@@ -253,7 +232,7 @@ class BlogPostAdmin(TimeStampedAdmin):
         (_('SEO & Analytics'), {
             'fields': (
                 'meta_description', 'meta_keywords',
-                'view_count', 'reading_time', 'estimated_reading_time'
+                'view_count', 'word_count', 'reading_time'
             ),
             'classes': ('collapse',)
         }),
@@ -288,10 +267,6 @@ class BlogPostAdmin(TimeStampedAdmin):
     is_published_display.boolean = True
     is_published_display.short_description = _('Is Published')
 
-    def estimated_reading_time(self, obj):
-        return f"{obj.estimated_reading_time} min"
-    estimated_reading_time.short_description = _('Calculated Reading Time')
-
     def save_model(self, request, obj, form, change):
         if not obj.author_id:
             obj.author = request.user
@@ -300,21 +275,11 @@ class BlogPostAdmin(TimeStampedAdmin):
 
 @admin.register(Tag)
 class TagAdmin(TimeStampedAdmin):
-    list_display = ('name', 'slug', 'blog_post_count', 'created_at')
+    list_display = ('name', 'slug', 'post_count', 'created_at')
     list_display_links = ('name',)
     search_fields = ('name', 'description')
     prepopulated_fields = {'slug': ('name',)}
-    readonly_fields = ('created_at', 'updated_at', 'blog_post_count')
-    
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(
-            posts_count=Count('blog_posts')
-        )
-
-    def blog_post_count(self, obj):
-        return obj.posts_count
-    blog_post_count.short_description = _('Blog Posts')
-    blog_post_count.admin_order_field = 'posts_count'
+    readonly_fields = ('created_at', 'updated_at', 'post_count')
 
 
 @admin.register(CoffeePurchase)
@@ -401,15 +366,74 @@ class CoffeePurchaseAdmin(TimeStampedAdmin):
     actions = ['mark_as_paid', 'mark_as_pending']
 
     def mark_as_paid(self, request, queryset):
-        updated = queryset.update(is_paid=True, payment_status='completed')
+        updated = revenue.mark_paid(queryset)
         self.message_user(request, f"{updated} purchases marked as paid.")
     mark_as_paid.short_description = _("Mark selected purchases as paid")
 
     def mark_as_pending(self, request, queryset):
-        updated = queryset.update(is_paid=False, payment_status='pending')
+        updated = revenue.mark_pending(queryset)
         self.message_user(request, f"{updated} purchases marked as pending.")
     mark_as_pending.short_description = _("Mark selected purchases as pending")
 
+    def get_urls(self):
+        dashboard = path(
+            'revenue/',
+            self.admin_site.admin_view(self.revenue_dashboard_view),
+            name='main_coffeepurchase_revenue',
+        )
+        return [dashboard] + super().get_urls()
+
+    def revenue_dashboard_view(self, request):
+        """Revenue charts drawn from the daily rollups, never from the purchases"""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        context = {
+            **self.admin_site.each_context(request),
+            **revenue.dashboard_data(),
+            'opts': self.model._meta,
+            'title': _('Coffee revenue'),
+        }
+        return TemplateResponse(request, 'admin/main/coffeepurchase/revenue_dashboard.html', context)
+
+
+@admin.register(NewsletterDelivery)
+class NewsletterDeliveryAdmin(TimeStampedAdmin):
+    """Read-only progress of newsletter sends; deliveries are driven by Celery"""
+    list_display = ('submission', 'status', 'progress_display', 'sent_count', 'failed_count', 'total', 'finished_at')
+    list_filter = ('status', 'created_at')
+    readonly_fields = (
+        'submission', 'status', 'total', 'sent_count', 'failed_count',
+        'failed_recipients', 'finished_at', 'created_at', 'updated_at',
+    )
+    view_on_site = False
+
+    def progress_display(self, obj):
+        return f"{obj.progress}%"
+    progress_display.short_description = _('Progress')
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(PageView)
+class PageViewAdmin(admin.ModelAdmin):
+    """Read-only list of stored page views; rows are only ever appended"""
+    list_display = ('path', 'device', 'referrer', 'viewed_at')
+    list_filter = ('device',)
+    search_fields = ('path',)
+    # Counting a large partitioned table on every page load is not worth it
+    show_full_result_count = False
+    view_on_site = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 
 @admin.register(SiteSettings)
 class SiteSettingsAdmin(admin.ModelAdmin):
@@ -0,0 +1,248 @@
+"""
+Page-view analytics.
+
+``PageViewMiddleware`` appends one entry per public page view to a Redis
+stream; the request never touches Postgres. The ``ingest_page_views`` task
+reads the stream through a consumer group in batches and bulk-inserts them
+into ``PageView``, an append-only table partitioned by month:
+
+    request -> XADD analytics:page_views -> ingest_page_views (beat) -> main_pageview_YYYYMM
+
+Entries are acknowledged only after their batch is stored, and the stream
+entry id is kept on the row so a batch that is read twice after a crash is
+not stored twice.
+"""
+import datetime
+import functools
+import logging
+import os
+import re
+import socket
+import time
+
+import redis
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connection as default_connection, transaction
+from django.utils import timezone
+
+from .models import PageView
+
+logger = logging.getLogger(__name__)
+
+PAGE_VIEW_STREAM_MAXLEN = getattr(settings, 'PAGE_VIEW_STREAM_MAXLEN', 100_000)
+PAGE_VIEW_BATCH_SIZE = getattr(settings, 'PAGE_VIEW_BATCH_SIZE', 1000)
+PAGE_VIEW_MAX_BATCHES = getattr(settings, 'PAGE_VIEW_MAX_BATCHES', 50)
+PAGE_VIEW_PARTITIONS_AHEAD = getattr(settings, 'PAGE_VIEW_PARTITIONS_AHEAD', 2)
+PAGE_VIEW_INGEST_TIMEOUT = getattr(settings, 'PAGE_VIEW_INGEST_TIMEOUT', 10)
+PAGE_VIEW_EXCLUDED_PATHS = getattr(
+    settings, 'PAGE_VIEW_EXCLUDED_PATHS', ('/admin/', '/static/', '/media/', '/tinymce/')
+)
+
+STREAM_KEY = 'analytics:page_views'
+CONSUMER_GROUP = 'page-view-ingest'
+# Entries a consumer read but did not acknowledge for this long are taken over
+CLAIM_IDLE_MS = 5 * 60 * 1000
+# After Redis fails, requests stop trying to record views for this many seconds
+RETRY_AFTER = 5
+
+BOT_RE = re.compile(r'bot|crawl|spider|slurp|curl|wget|python-|httpx|headless|monitor|preview', re.I)
+TABLET_RE = re.compile(r'ipad|tablet|kindle|silk|playbook|android(?!.*mobile)', re.I)
+MOBILE_RE = re.compile(r'mobi|iphone|ipod|windows phone|opera mini|blackberry', re.I)
+
+
+def device_class(user_agent):
+    """Coarse device class of a User-Agent string"""
+    if not user_agent:
+        return 'unknown'
+    if BOT_RE.search(user_agent):
+        return 'bot'
+    if TABLET_RE.search(user_agent):
+        return 'tablet'
+    if MOBILE_RE.search(user_agent):
+        return 'mobile'
+    return 'desktop'
+
+
+@functools.lru_cache(maxsize=None)
+def get_redis():
+    """
+    Client for the stream with short timeouts, so a slow Redis delays a
+    request by at most a fraction of a second
+    """
+    return redis.Redis.from_url(settings.REDIS_URL, socket_timeout=0.1, socket_connect_timeout=0.1)
+
+
+@functools.lru_cache(maxsize=None)
+def get_ingest_redis():
+    """
+    Client for the ingestion task, which reads whole batches and can wait
+    for a busy Redis
+    """
+    return redis.Redis.from_url(
+        settings.REDIS_URL, socket_timeout=PAGE_VIEW_INGEST_TIMEOUT, socket_connect_timeout=PAGE_VIEW_INGEST_TIMEOUT
+    )
+
+
+def is_page_view(request, response):
+    if request.method != 'GET':
+        return False
+    if request.path.startswith(PAGE_VIEW_EXCLUDED_PATHS):
+        return False
+    # Browser prefetches and prerenders are not views until they are shown
+    purpose = request.headers.get('Sec-Purpose') or request.headers.get('Purpose') or ''
+    if 'prefetch' in purpose:
+        return False
+    if response.status_code == 304:
+        return True
+    return response.status_code == 200 and response.get('Content-Type', '').startswith('text/html')
+
+
+def record_page_view(request):
+    """Append one view to the stream; the oldest entries are dropped past the cap"""
+    get_redis().xadd(
+        STREAM_KEY,
+        {
+            'path': request.path[:500],
+            'referrer': request.headers.get('Referer', '')[:500],
+            'device': device_class(request.headers.get('User-Agent', '')),
+            'ts': f'{time.time():.3f}',
+        },
+        maxlen=PAGE_VIEW_STREAM_MAXLEN,
+        approximate=True,
+    )
+
+
+class PageViewMiddleware:
+    """
+    Record public page views in the analytics stream.
+
+    Under ASGI the Redis call runs in a worker thread so it never blocks
+    the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.retry_at = 0.0
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self.should_record(request, response):
+            self.record(request)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self.should_record(request, response):
+            await sync_to_async(self.record, thread_sensitive=False)(request)
+        return response
+
+    def should_record(self, request, response):
+        return is_page_view(request, response) and time.monotonic() >= self.retry_at
+
+    def record(self, request):
+        try:
+            record_page_view(request)
+        except redis.RedisError as e:
+            logger.warning(f"Could not record page view: {e}")
+            self.retry_at = time.monotonic() + RETRY_AFTER
+
+
+# ==================== INGESTION ====================
+
+def ensure_consumer_group(client):
+    try:
+        client.xgroup_create(STREAM_KEY, CONSUMER_GROUP, id='0', mkstream=True)
+    except redis.ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+
+def read_batch(client, consumer, batch_size):
+    """Entries abandoned by a crashed consumer first, then new ones"""
+    _, entries, *_ = client.xautoclaim(
+        STREAM_KEY, CONSUMER_GROUP, consumer, min_idle_time=CLAIM_IDLE_MS, count=batch_size
+    )
+    entries = [(entry_id, fields) for entry_id, fields in entries if fields]
+    if entries:
+        return entries
+    response = client.xreadgroup(CONSUMER_GROUP, consumer, {STREAM_KEY: '>'}, count=batch_size)
+    return response[0][1] if response else []
+
+
+def page_view_from_entry(entry_id, fields):
+    fields = {key.decode(): value.decode() for key, value in fields.items()}
+    return PageView(
+        event_id=entry_id.decode(),
+        viewed_at=datetime.datetime.fromtimestamp(float(fields['ts']), tz=datetime.timezone.utc),
+        path=fields['path'],
+        referrer=fields.get('referrer', ''),
+        device=fields.get('device', 'unknown'),
+    )
+
+
+def store_page_views(entries):
+    """Insert one batch of stream entries; entries already stored are skipped"""
+    views = []
+    for entry_id, fields in entries:
+        try:
+            views.append(page_view_from_entry(entry_id, fields))
+        except (KeyError, ValueError, UnicodeDecodeError) as e:
+            logger.warning(f"Dropping malformed page view {entry_id!r}: {e}")
+    PageView.objects.bulk_create(views, ignore_conflicts=True)
+    return len(views)
+
+
+def ingest_page_views(batch_size=PAGE_VIEW_BATCH_SIZE, max_batches=PAGE_VIEW_MAX_BATCHES):
+    """Move up to ``max_batches`` batches from the stream into ``PageView``"""
+    client = get_ingest_redis()
+    ensure_consumer_group(client)
+    consumer = f'{socket.gethostname()}:{os.getpid()}'
+    ingested = 0
+    for _ in range(max_batches):
+        entries = read_batch(client, consumer, batch_size)
+        if not entries:
+            break
+        ingested += store_page_views(entries)
+        entry_ids = [entry_id for entry_id, _ in entries]
+        client.pipeline().xack(STREAM_KEY, CONSUMER_GROUP, *entry_ids).xdel(STREAM_KEY, *entry_ids).execute()
+    return ingested
+
+
+# ==================== PARTITIONS ====================
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def create_page_view_partitions(months_ahead=PAGE_VIEW_PARTITIONS_AHEAD, connection=None):
+    """
+    Create the monthly partitions from this month to ``months_ahead`` months
+    on. Views outside every partition land in ``main_pageview_default``, so
+    partitions are made well before their month starts.
+    """
+    connection = connection or default_connection
+    this_month = timezone.now().date().replace(day=1)
+    created = []
+    for offset in range(months_ahead + 1):
+        start, end = add_months(this_month, offset), add_months(this_month, offset + 1)
+        name = f'main_pageview_{start:%Y%m}'
+        try:
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF main_pageview "
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                )
+        except DatabaseError as e:
+            # The default partition already holds views for this month
+            logger.error(f"Could not create page view partition {name}: {e}")
+            continue
+        created.append(name)
+    return created
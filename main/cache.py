@@ -0,0 +1,314 @@
+"""
+Full-page cache for the public listing views.
+
+Every cached page key embeds a site-wide generation number. Content changes
+(see ``main.signals``) bump the generation, which orphans every cached page
+at once instead of having to track which pages showed which object.
+"""
+import datetime
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, urlencode
+
+PAGE_CACHE_TIMEOUT = getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 15)
+PAGE_CACHE_GENERATION_KEY = 'page_cache:generation'
+
+# Rendered into cached pages in place of the per-visitor CSRF token and
+# swapped for a real token every time the page is served.
+CSRF_PLACEHOLDER = 'page-cache-csrf-token-placeholder'
+
+
+def get_generation(key):
+    """Return the current value of a generation counter, starting one if needed"""
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(key):
+    cache.set(key, time.time_ns(), timeout=None)
+
+
+def get_page_cache_generation():
+    """Return the current page cache generation, starting one if needed"""
+    return get_generation(PAGE_CACHE_GENERATION_KEY)
+
+
+def invalidate_page_cache():
+    """Drop every cached page by moving to a new generation"""
+    bump_generation(PAGE_CACHE_GENERATION_KEY)
+
+
+class CachedPageMixin:
+    """
+    Serve anonymous GET requests from the page cache.
+
+    ``cache_vary_params`` lists the query string parameters that change the
+    rendered page. Requests carrying any other parameter bypass the cache,
+    since pages echo their own URL (canonical links, pagination).
+    """
+    cache_vary_params = ()
+    cache_timeout = PAGE_CACHE_TIMEOUT
+
+    def is_page_cacheable(self):
+        request = self.request
+        return (
+            request.method in ('GET', 'HEAD')
+            and has_only_params(request, self.cache_vary_params)
+            and not request.user.is_authenticated
+        )
+
+    def get_page_cache_key(self):
+        return page_cache_key(self.__class__.__name__, self.request, self.cache_vary_params)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if getattr(self, '_rendering_for_cache', False):
+            context['csrf_token'] = CSRF_PLACEHOLDER
+        return context
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.is_page_cacheable():
+            return super().dispatch(request, *args, **kwargs)
+
+        cache_key = self.get_page_cache_key()
+        cached = cache.get(cache_key)
+        if cached is not None:
+            content, content_type = cached
+            return self.build_cached_response(content, content_type, 'HIT')
+
+        self._rendering_for_cache = True
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code != 200 or not hasattr(response, 'render'):
+            return response
+
+        response.render()
+        content_type = response.get('Content-Type')
+        cache.set(cache_key, (response.content, content_type), self.cache_timeout)
+        return self.build_cached_response(response.content, content_type, 'MISS')
+
+    def build_cached_response(self, content, content_type, status):
+        return cached_page_response(self.request, content, content_type, status)
+
+
+def has_only_params(request, vary_params):
+    """Whether every query string parameter is one the cache entry varies on"""
+    return set(request.GET).issubset(vary_params)
+
+
+def page_cache_key(name, request, vary_params=()):
+    # Pages build absolute URLs, so the host is part of the key
+    params = urlencode(
+        [('host', request.get_host())]
+        + [(param, request.GET.get(param, '')) for param in vary_params]
+    )
+    digest = hashlib.md5(params.encode()).hexdigest()
+    return f'page_cache:{get_page_cache_generation()}:{name}:{digest}'
+
+
+def cached_page_response(request, content, content_type, status):
+    """Serve a cached page with this visitor's CSRF token filled in"""
+    placeholder = CSRF_PLACEHOLDER.encode()
+    if placeholder in content:
+        content = content.replace(placeholder, get_token(request).encode())
+    response = HttpResponse(content, content_type=content_type)
+    response['X-Page-Cache'] = status
+    return response
+
+
+def cache_until_content_changes(vary_params=()):
+    """
+    Cache a public, non-personalised view (sitemaps, feeds) in the page cache.
+
+    Entries share the page cache generation, so publishing or editing
+    content drops them with every cached page. Streaming responses are
+    passed through as they are produced and stored once fully sent.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not has_only_params(request, vary_params):
+                return view(request, *args, **kwargs)
+            # Links in these documents are absolute, so the host is part of the key
+            params = urlencode(
+                [('host', request.get_host())]
+                + [(name, value) for name, value in sorted(kwargs.items())]
+                + [(param, request.GET.get(param, '')) for param in vary_params]
+            )
+            digest = hashlib.md5(params.encode()).hexdigest()
+            cache_key = f'page_cache:{get_page_cache_generation()}:{view.__module__}.{view.__name__}:{digest}'
+            cached = cache.get(cache_key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+                response['X-Page-Cache'] = 'HIT'
+                return response
+
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            content_type = response.get('Content-Type')
+            if response.streaming:
+                response.streaming_content = store_when_sent(
+                    cache_key, response.streaming_content, content_type
+                )
+            else:
+                cache.set(cache_key, (response.content, content_type), PAGE_CACHE_TIMEOUT)
+            response['X-Page-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def store_when_sent(cache_key, chunks, content_type):
+    sent = []
+    for chunk in chunks:
+        sent.append(chunk)
+        yield chunk
+    cache.set(cache_key, (b''.join(sent), content_type), PAGE_CACHE_TIMEOUT)
+
+
+# ==================== CARD FRAGMENTS ====================
+
+# Cards are keyed on their object's updated_at, so they can live much longer
+# than whole pages; see the ``cardcache`` template tag.
+CARD_CACHE_TIMEOUT = getattr(settings, 'CARD_CACHE_TIMEOUT', 60 * 60 * 24)
+CARD_CACHE_VERSION_KEY = 'card_cache:version'
+
+
+def get_card_cache_version():
+    return get_generation(CARD_CACHE_VERSION_KEY)
+
+
+def invalidate_card_cache():
+    """Drop every cached card, e.g. after a category or author was renamed"""
+    bump_generation(CARD_CACHE_VERSION_KEY)
+
+
+def card_cache_key(name, obj, version):
+    """
+    Cache key of one rendered card.
+
+    ``updated_at`` moves whenever the object or its categories, tags or
+    technologies change (see ``main.signals``); ``version`` covers changes
+    to the shared objects shown on many cards.
+    """
+    return f'card:{name}:{version}:{obj._meta.label_lower}:{obj.pk}:{obj.updated_at.timestamp()}'
+
+
+# ==================== CONDITIONAL GET ====================
+
+class ConditionalDetailMixin:
+    """
+    Answer revalidation requests for a DetailView with 304 Not Modified.
+
+    The validators combine the object's ``updated_at`` with the page cache
+    generation (moved by any content change, so related items stay fresh)
+    and the card version (authors, categories and other shared objects).
+    When the request carries validators, only the object's ``updated_at`` is
+    read before deciding, so an unchanged page costs one small query and no
+    rendering. Per-hit values such as the view counter are deliberately left
+    out of the validators; override ``not_modified`` to still record the hit.
+    """
+
+    def get_validators(self, obj):
+        generations = (get_page_cache_generation(), get_card_cache_version())
+        tag = f'{obj._meta.label_lower}:{obj.pk}:{obj.updated_at.timestamp()}:{generations}'
+        etag = f'"{hashlib.md5(tag.encode()).hexdigest()}"'
+        # Generations are time_ns stamps of the last change they cover
+        changed = datetime.datetime.fromtimestamp(max(generations) / 1e9, tz=datetime.timezone.utc)
+        return etag, max(obj.updated_at, changed)
+
+    def not_modified(self, obj):
+        """Hook for a request answered with 304 for ``obj``"""
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        if 'HTTP_IF_NONE_MATCH' in request.META or 'HTTP_IF_MODIFIED_SINCE' in request.META:
+            obj = self.get_object(
+                self.get_queryset().select_related(None).prefetch_related(None).only('pk', 'updated_at')
+            )
+            etag, last_modified = self.get_validators(obj)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=int(last_modified.timestamp())
+            )
+            if response is not None:
+                self.not_modified(obj)
+                self.set_validators(response, obj)
+                return response
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200 and getattr(self, 'object', None) is not None:
+            # Rendering can still move a generation (e.g. by creating SiteSettings)
+            if hasattr(response, 'add_post_render_callback'):
+                response.add_post_render_callback(lambda rendered: self.set_validators(rendered, self.object))
+            else:
+                self.set_validators(response, self.object)
+        return response
+
+    def set_validators(self, response, obj):
+        etag, last_modified = self.get_validators(obj)
+        response.headers.setdefault('ETag', etag)
+        response.headers.setdefault('Last-Modified', http_date(last_modified.timestamp()))
+        # Let browsers and proxies keep the page but always revalidate it
+        patch_cache_control(response, no_cache=True)
+
+
+# ==================== SITE SETTINGS ====================
+
+SITE_SETTINGS_VERSION_KEY = 'site_settings:version'
+
+# Process-local copy of the settings as (version, instance)
+_site_settings_local = None
+
+
+def get_site_settings():
+    """
+    Return the SiteSettings singleton without touching the database.
+
+    Each process keeps its own copy and only re-reads the shared cache when
+    the shared version moves on, which happens whenever the settings are
+    saved in any worker. Treat the returned instance as read-only.
+    """
+    global _site_settings_local
+    from .models import SiteSettings
+
+    version = cache.get(SITE_SETTINGS_VERSION_KEY)
+    if version is not None and _site_settings_local and _site_settings_local[0] == version:
+        return _site_settings_local[1]
+
+    if version is None:
+        cache.add(SITE_SETTINGS_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(SITE_SETTINGS_VERSION_KEY)
+    site_settings = cache.get(f'site_settings:{version}')
+    if site_settings is None:
+        # A row read before a save commits is stored under the version
+        # that save then retires, so it is never served afterwards
+        site_settings = SiteSettings.load()
+        cache.set(f'site_settings:{version}', site_settings, timeout=None)
+
+    _site_settings_local = (version, site_settings)
+    return site_settings
+
+
+def invalidate_site_settings():
+    """
+    Force every worker to reload the site settings on its next request.
+    Call it once the change is committed.
+    """
+    global _site_settings_local
+    _site_settings_local = None
+    version = cache.get(SITE_SETTINGS_VERSION_KEY)
+    cache.set(SITE_SETTINGS_VERSION_KEY, time.time_ns(), timeout=None)
+    cache.delete(f'site_settings:{version}')
@@ -0,0 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
+from .cache import get_site_settings
+
+
+def site_settings(request):
+    """Make the cached site settings available to every template"""
+    return {'site_settings': SimpleLazyObject(get_site_settings)}
@@ -0,0 +1,130 @@
+"""
+Counters kept outside the hot path.
+
+Blog page views are counted in a Redis hash and written to the database in
+bulk by the ``flush_view_counts`` task, so a page view never writes to the
+BlogPost row. Category, Tag and Technology usage counts are stored on the
+rows themselves and recounted by ``main.signals`` when their items change.
+"""
+import functools
+import logging
+
+import redis
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Case, F, Func, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+logger = logging.getLogger(__name__)
+
+VIEW_COUNTS_KEY = 'blog:view_counts'
+
+
+@functools.lru_cache(maxsize=None)
+def get_redis():
+    """Shared Redis client for counters"""
+    return redis.Redis.from_url(settings.REDIS_URL)
+
+
+def record_view(post_id):
+    """Count one view of a post and return its pending (unflushed) views"""
+    return get_redis().hincrby(VIEW_COUNTS_KEY, post_id, 1)
+
+
+def get_pending_views(post_ids):
+    """Map post ids to views counted since the last flush"""
+    post_ids = list(post_ids)
+    if not post_ids:
+        return {}
+    values = get_redis().hmget(VIEW_COUNTS_KEY, post_ids)
+    return {post_id: int(value or 0) for post_id, value in zip(post_ids, values)}
+
+
+def attach_pending_views(posts):
+    """Set ``pending_views`` on each post so templates can show live totals"""
+    posts = list(posts)
+    try:
+        pending = get_pending_views(post.pk for post in posts)
+    except redis.RedisError as e:
+        logger.warning(f"Could not read pending view counts: {e}")
+        return posts
+    for post in posts:
+        post.pending_views = pending.get(post.pk, 0)
+    return posts
+
+
+def flush_view_counts():
+    """
+    Move all pending view counts into the database with one UPDATE.
+
+    The hash is read and deleted in one MULTI/EXEC, so views counted while
+    the flush runs land in a fresh hash and two overlapping flushes never
+    apply the same batch. If the UPDATE fails the batch is added back; if the
+    worker dies in between, that batch is lost rather than counted twice.
+    """
+    from .models import BlogPost
+
+    client = get_redis()
+    pipe = client.pipeline(transaction=True)
+    pipe.hgetall(VIEW_COUNTS_KEY)
+    pipe.delete(VIEW_COUNTS_KEY)
+    counts, _ = pipe.execute()
+
+    deltas = {int(post_id): int(count) for post_id, count in counts.items() if int(count) > 0}
+    if not deltas:
+        return 0
+    try:
+        with transaction.atomic():
+            BlogPost.objects.filter(pk__in=deltas).update(
+                view_count=F('view_count') + Case(
+                    *[When(pk=post_id, then=Value(count)) for post_id, count in deltas.items()],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                )
+            )
+    except DatabaseError:
+        restore = client.pipeline(transaction=True)
+        for post_id, count in deltas.items():
+            restore.hincrby(VIEW_COUNTS_KEY, post_id, count)
+        restore.execute()
+        raise
+    return sum(deltas.values())
+
+
+# ==================== USAGE COUNTERS ====================
+
+PUBLIC_PROJECTS = {'status': 'completed'}
+PUBLIC_POSTS = {'published': True, 'status': 'published'}
+
+# Stored counter field -> (reverse relation, filter for items that count)
+USAGE_COUNTS = {
+    'category': {
+        'project_count': ('projects', PUBLIC_PROJECTS),
+        'post_count': ('blog_posts', PUBLIC_POSTS),
+    },
+    'technology': {
+        'project_count': ('projects', PUBLIC_PROJECTS),
+    },
+    'tag': {
+        'post_count': ('blog_posts', PUBLIC_POSTS),
+    },
+}
+
+
+def usage_count(model, relation, visible):
+    """Correlated COUNT of the public items behind a reverse M2M relation"""
+    rel = model._meta.get_field(relation)
+    items = rel.related_model.objects.filter(**{rel.field.name: OuterRef('pk')}, **visible)
+    return Coalesce(
+        Subquery(items.order_by().annotate(total=Func('pk', function='COUNT', output_field=IntegerField())).values('total')),
+        0,
+    )
+
+
+def recount_usage(queryset):
+    """Recompute the stored usage counters of every row in the queryset"""
+    model = queryset.model
+    return queryset.update(**{
+        field: usage_count(model, relation, visible)
+        for field, (relation, visible) in USAGE_COUNTS[model._meta.model_name].items()
+    })
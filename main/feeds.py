@@ -0,0 +1,68 @@
+"""
+RSS and Atom feeds of the latest blog posts.
+
+Built on ``django.utils.feedgenerator`` rather than the syndication
+framework's ``Feed`` view, which resolves links through a ``Site`` row;
+like the sitemaps, feeds link to whatever host they were requested on.
+"""
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.translation import get_language
+
+from .cache import cache_until_content_changes, get_site_settings
+from .sitemaps import published_posts
+
+FEED_LENGTH = 20
+
+
+def latest_posts():
+    return (
+        published_posts()
+        .select_related('author')
+        .prefetch_related('categories')
+        .only(
+            'title', 'slug', 'excerpt', 'published_at', 'updated_at',
+            'author__username', 'author__first_name', 'author__last_name',
+        )
+        .order_by('-published_at', '-id')[:FEED_LENGTH]
+    )
+
+
+def build_feed(request, feed_type):
+    site_settings = get_site_settings()
+    description = site_settings.site_description or 'Latest posts'
+    feed = feed_type(
+        title=f'{site_settings.site_name} | Blog',
+        link=request.build_absolute_uri(reverse('blog_list')),
+        description=description,
+        subtitle=description,
+        feed_url=request.build_absolute_uri(),
+        language=get_language(),
+    )
+    for post in latest_posts():
+        link = request.build_absolute_uri(post.get_absolute_url())
+        feed.add_item(
+            title=post.title,
+            link=link,
+            description=post.excerpt,
+            unique_id=link,
+            pubdate=post.published_at,
+            updateddate=post.updated_at,
+            author_name=post.author.get_full_name() or post.author.username,
+            categories=[category.name for category in post.categories.all()],
+        )
+
+    response = HttpResponse(content_type=feed.content_type)
+    feed.write(response, 'utf-8')
+    return response
+
+
+@cache_until_content_changes()
+def latest_posts_rss(request):
+    return build_feed(request, Rss201rev2Feed)
+
+
+@cache_until_content_changes()
+def latest_posts_atom(request):
+    return build_feed(request, Atom1Feed)
@@ -0,0 +1,136 @@
+"""
+Responsive image variants.
+
+When a project or post image is uploaded, the ``generate_image_variants``
+task resizes it to each of ``VARIANT_WIDTHS`` in every format of
+``VARIANT_FORMATS`` and records the result in the model's
+``image_variants`` field::
+
+    {'featured_image': {
+        'source': 'blog/2025/01/cover.jpg', 'width': 2400, 'height': 1260,
+        'variants': {'avif': [[480, 'blog/2025/01/variants/cover-480.avif'], ...],
+                     'webp': [...]},
+    }}
+
+The ``responsive_image`` template tag turns that into a ``<picture>`` with
+``srcset``/``sizes`` and the intrinsic width and height of the image.
+"""
+import io
+import logging
+import posixpath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = (480, 800, 1200, 1600)
+
+# Best format first; formats Pillow was built without are skipped
+VARIANT_FORMATS = tuple(
+    (fmt, options) for fmt, options in (
+        ('avif', {'quality': 55}),
+        ('webp', {'quality': 80, 'method': 6}),
+    )
+    if features.check(fmt)
+)
+
+# Image fields that get variants, per model label
+IMAGE_FIELDS = {
+    'main.project': ('image', 'featured_image'),
+    'main.blogpost': ('featured_image',),
+}
+
+
+def variant_name(source_name, width, fmt):
+    directory, filename = posixpath.split(source_name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, 'variants', f'{stem}-{width}.{fmt}')
+
+
+def build_variants(source_name, storage=default_storage):
+    """Write every variant of one stored image and describe them"""
+    with storage.open(source_name) as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    width, height = image.size
+    # Never upscale; an image narrower than every width gets one variant at its own size
+    widths = [w for w in VARIANT_WIDTHS if w < width] or [width]
+    variants = {fmt: [] for fmt, _ in VARIANT_FORMATS}
+    for target_width in widths:
+        resized = image.resize(
+            (target_width, round(height * target_width / width)), Image.Resampling.LANCZOS
+        )
+        for fmt, options in VARIANT_FORMATS:
+            buffer = io.BytesIO()
+            resized.save(buffer, format=fmt.upper(), **options)
+            name = variant_name(source_name, target_width, fmt)
+            if storage.exists(name):
+                storage.delete(name)
+            variants[fmt].append([target_width, storage.save(name, ContentFile(buffer.getvalue()))])
+
+    return {'source': source_name, 'width': width, 'height': height, 'variants': variants}
+
+
+def delete_variants(entry, storage=default_storage):
+    for files in entry.get('variants', {}).values():
+        for _, name in files:
+            storage.delete(name)
+
+
+def discard_image_variants(instance):
+    """Delete the variant files of a deleted object once the deletion is committed"""
+    entries = list((instance.image_variants or {}).values())
+
+    def delete_all():
+        for entry in entries:
+            delete_variants(entry)
+
+    if entries:
+        transaction.on_commit(delete_all)
+
+
+def stale_image_fields(instance):
+    """Image fields whose recorded variants do not match the current file"""
+    recorded = instance.image_variants or {}
+    return [
+        field for field in IMAGE_FIELDS[instance._meta.label_lower]
+        if (getattr(instance, field).name or None) != recorded.get(field, {}).get('source')
+    ]
+
+
+def refresh_image_variants(model, pk):
+    """Bring the stored variants of one object in line with its image fields"""
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return {}
+
+    variants = dict(instance.image_variants or {})
+    for field in stale_image_fields(instance):
+        if field in variants:
+            delete_variants(variants.pop(field))
+        source_name = getattr(instance, field).name
+        if source_name:
+            try:
+                variants[field] = build_variants(source_name)
+            except (OSError, Image.DecompressionBombError) as e:
+                logger.error(f"Could not build variants of {source_name}: {e}")
+
+    # Moving updated_at also retires the cached cards that show this image
+    model.objects.filter(pk=pk).update(image_variants=variants, updated_at=timezone.now())
+    return variants
+
+
+def schedule_image_variants(instance):
+    """Queue variant generation once the upload has been committed"""
+    from .tasks import generate_image_variants
+
+    if stale_image_fields(instance):
+        label, pk = instance._meta.label_lower, instance.pk
+        transaction.on_commit(lambda: generate_image_variants.delay(label, pk))
@@ -0,0 +1,200 @@
+"""
+Newsletter delivery.
+
+django-newsletter's ``Submission.submit()`` mails every subscriber from one
+process, opening a new SMTP connection per message. Here a due submission
+is claimed once and its recipients are split into ``NEWSLETTER_CHUNK_SIZE``
+chunks, each sent by a Celery task over a single SMTP connection:
+
+    send_newsletters (beat) -> start_delivery -> send_newsletter_chunk x N
+
+A Redis-backed limiter keeps every worker together under
+``NEWSLETTER_SEND_RATE`` messages per second. Recipients that fail are
+retried with exponential backoff, and progress is counted on the
+submission's ``NewsletterDelivery`` row.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from newsletter.models import Submission, Subscription
+from redis.exceptions import RedisError
+
+from .counters import get_redis
+from .models import NewsletterDelivery
+
+logger = logging.getLogger(__name__)
+
+NEWSLETTER_CHUNK_SIZE = getattr(settings, 'NEWSLETTER_CHUNK_SIZE', 500)
+NEWSLETTER_SEND_RATE = getattr(settings, 'NEWSLETTER_SEND_RATE', 50)
+NEWSLETTER_MAX_RETRIES = getattr(settings, 'NEWSLETTER_MAX_RETRIES', 5)
+NEWSLETTER_RETRY_BACKOFF = getattr(settings, 'NEWSLETTER_RETRY_BACKOFF', 60)
+
+RATE_KEY = 'newsletter:send_rate'
+
+
+class SendRateLimiter:
+    """
+    Fixed one-second windows shared by every worker through Redis.
+
+    Without Redis each process paces itself to the whole rate instead,
+    which errs on the side of sending too slowly rather than too fast.
+    """
+
+    def __init__(self, rate=NEWSLETTER_SEND_RATE):
+        self.rate = rate
+        self.last_local_send = 0.0
+
+    def wait(self):
+        if not self.rate:
+            return
+        try:
+            self.wait_shared()
+        except RedisError as e:
+            logger.warning(f"Send rate limiter falling back to local pacing: {e}")
+            self.wait_local()
+
+    def wait_shared(self):
+        client = get_redis()
+        while True:
+            window = int(time.time())
+            key = f'{RATE_KEY}:{window}'
+            used = client.incr(key)
+            if used == 1:
+                client.expire(key, 5)
+            if used <= self.rate:
+                return
+            time.sleep(max(0.0, window + 1 - time.time()))
+
+    def wait_local(self):
+        delay = self.last_local_send + 1 / self.rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.last_local_send = time.monotonic()
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def due_submissions():
+    """Submissions django-newsletter considers ready to go out"""
+    return Submission.objects.filter(
+        prepared=True, sent=False, sending=False, publish_date__lt=timezone.now()
+    )
+
+
+def start_delivery(submission_id):
+    """
+    Claim a submission and fan its recipients out as chunk tasks.
+
+    Returns the delivery, or None when another worker already claimed it.
+    """
+    from .tasks import send_newsletter_chunk
+
+    with transaction.atomic():
+        claimed = due_submissions().filter(pk=submission_id).update(sending=True)
+        if not claimed:
+            return None
+        submission = Submission.objects.get(pk=submission_id)
+        recipient_ids = list(
+            submission.subscriptions.filter(subscribed=True).order_by('pk').values_list('pk', flat=True)
+        )
+        delivery, _ = NewsletterDelivery.objects.update_or_create(
+            submission=submission,
+            defaults={
+                'status': 'sending', 'total': len(recipient_ids), 'sent_count': 0,
+                'failed_count': 0, 'failed_recipients': [], 'finished_at': None,
+            },
+        )
+        for chunk in chunked(recipient_ids, NEWSLETTER_CHUNK_SIZE):
+            transaction.on_commit(lambda chunk=chunk: send_newsletter_chunk.delay(delivery.pk, chunk))
+
+    logger.info(f"Delivering {submission} to {len(recipient_ids)} subscribers")
+    if not recipient_ids:
+        finish_if_complete(delivery.pk)
+    return delivery
+
+
+def send_chunk(delivery_id, subscription_ids, limiter=None):
+    """
+    Send one chunk over a single SMTP connection.
+
+    Returns the ids of the subscriptions whose message could not be sent.
+    """
+    delivery = NewsletterDelivery.objects.select_related(
+        'submission__message__newsletter', 'submission__newsletter', 'submission__site'
+    ).get(pk=delivery_id)
+    submission = delivery.submission
+    subscriptions = list(
+        Subscription.objects.filter(pk__in=subscription_ids, subscribed=True).select_related('user')
+    )
+    limiter = limiter or SendRateLimiter()
+
+    sent, failed = 0, []
+    connection = get_connection()
+    try:
+        connection.open()
+        for subscription in subscriptions:
+            limiter.wait()
+            try:
+                message = submission.get_message(subscription)
+                message.connection = connection
+                message.send()
+                sent += 1
+            except Exception as e:
+                # Whatever went wrong, it only costs this recipient a retry
+                logger.warning(f"Newsletter to {subscription.get_email()} failed: {e!r}")
+                failed.append(subscription.pk)
+                if isinstance(e, OSError):
+                    # smtplib errors are OSErrors; the connection is reopened for the rest
+                    connection.close()
+                    connection.open()
+    except Exception as e:
+        logger.exception(f"Delivery {delivery_id} stopped mid-chunk: {e!r}")
+        failed.extend(subscription.pk for subscription in subscriptions[sent + len(failed):])
+    finally:
+        connection.close()
+        # Recipients who unsubscribed since the delivery started are not owed a message
+        skipped = len(subscription_ids) - len(subscriptions)
+        if sent or skipped:
+            NewsletterDelivery.objects.filter(pk=delivery_id).update(
+                sent_count=F('sent_count') + sent, total=F('total') - skipped
+            )
+    return failed
+
+
+def record_failures(delivery_id, subscription_ids):
+    """Give up on recipients that ran out of retries"""
+    emails = [
+        subscription.get_email()
+        for subscription in Subscription.objects.filter(pk__in=subscription_ids).select_related('user')
+    ]
+    with transaction.atomic():
+        delivery = NewsletterDelivery.objects.select_for_update().get(pk=delivery_id)
+        delivery.failed_count += len(subscription_ids)
+        delivery.failed_recipients += emails
+        delivery.save(update_fields=['failed_count', 'failed_recipients', 'updated_at'])
+
+
+def finish_if_complete(delivery_id):
+    """Close the delivery once every recipient was either sent or given up on"""
+    finished = NewsletterDelivery.objects.filter(
+        pk=delivery_id,
+        finished_at__isnull=True,
+        total__lte=F('sent_count') + F('failed_count'),
+    ).update(finished_at=timezone.now())
+    if not finished:
+        return False
+
+    delivery = NewsletterDelivery.objects.get(pk=delivery_id)
+    delivery.status = 'partial' if delivery.failed_count else 'sent'
+    delivery.save(update_fields=['status', 'updated_at'])
+    Submission.objects.filter(pk=delivery.submission_id).update(sending=False, sent=True)
+    logger.info(f"Delivery {delivery_id} finished: {delivery.sent_count} sent, {delivery.failed_count} failed")
+    return True
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from main.images import IMAGE_FIELDS, refresh_image_variants, stale_image_fields
+from main.models import BlogPost, Project
+
+
+class Command(BaseCommand):
+    help = "Build missing or outdated responsive image variants for projects and blog posts"
+
+    def handle(self, *args, **options):
+        for model in (Project, BlogPost):
+            fields = IMAGE_FIELDS[model._meta.label_lower]
+            built = 0
+            for instance in model.objects.only('pk', 'image_variants', *fields).iterator():
+                if stale_image_fields(instance):
+                    refresh_image_variants(model, instance.pk)
+                    built += 1
+            self.stdout.write(self.style.SUCCESS(f"Refreshed image variants for {built} {model._meta.verbose_name_plural}"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main.revenue import rebuild_revenue_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily coffee revenue rollups from the purchases"
+
+    def handle(self, *args, **options):
+        rows = rebuild_revenue_rollups()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} daily revenue rows"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from main.related import RELATED_KINDS, rebuild_related_items
+
+
+class Command(BaseCommand):
+    help = "Rebuild the precomputed related projects and blog posts"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind',
+            choices=sorted(RELATED_KINDS),
+            help="Only rebuild one kind of item",
+        )
+
+    def handle(self, *args, **options):
+        kinds = [options['kind']] if options['kind'] else sorted(RELATED_KINDS)
+        for kind in kinds:
+            rebuild_related_items(kind)
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt related items for {kind}"))
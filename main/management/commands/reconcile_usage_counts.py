@@ -0,0 +1,42 @@
+from functools import reduce
+from operator import or_
+
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from main.counters import USAGE_COUNTS, recount_usage, usage_count
+from main.models import Category, Tag, Technology
+
+
+class Command(BaseCommand):
+    help = "Repair drift in the stored Category, Tag and Technology usage counters"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Report drifted rows without fixing them",
+        )
+
+    def handle(self, *args, **options):
+        for model in (Category, Technology, Tag):
+            counts = USAGE_COUNTS[model._meta.model_name]
+            expected = model.objects.annotate(**{
+                f'expected_{field}': usage_count(model, relation, visible)
+                for field, (relation, visible) in counts.items()
+            })
+            drifted = expected.filter(reduce(or_, (
+                ~Q(**{field: F(f'expected_{field}')}) for field in counts
+            )))
+            drifted_pks = list(drifted.values_list('pk', flat=True))
+
+            if drifted_pks and not options['dry_run']:
+                recount_usage(model.objects.filter(pk__in=drifted_pks))
+
+            label = model._meta.verbose_name_plural
+            if not drifted_pks:
+                self.stdout.write(f"{label}: counters are correct")
+            elif options['dry_run']:
+                self.stdout.write(self.style.WARNING(f"{label}: {len(drifted_pks)} rows have drifted"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{label}: repaired {len(drifted_pks)} rows"))
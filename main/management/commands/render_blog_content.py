@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from main.models import BlogPost
+from main.rendering import render_posts
+
+
+class Command(BaseCommand):
+    help = "Re-render stored blog post bodies that are out of date (e.g. after a renderer change)"
+
+    def handle(self, *args, **options):
+        rendered = render_posts(BlogPost.objects.all())
+        self.stdout.write(self.style.SUCCESS(f"Rendered {rendered} blog posts"))
@@ -0,0 +1,86 @@
+"""
+Development middleware that reports repeated queries.
+
+Every SQL statement run while handling a request is grouped by its text
+(parameters excluded). A statement that runs ``QUERY_PATTERN_THRESHOLD``
+times or more is almost always an N+1 loop, and is logged with the template
+line, or failing that the project source line, that triggered it.
+"""
+import logging
+import os
+import sys
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.template.base import Node
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = str(settings.BASE_DIR)
+
+
+def query_origin():
+    """Template line or project source line that is running the current query"""
+    frame = sys._getframe(2)
+    source_line = None
+    while frame is not None:
+        node = frame.f_locals.get('self')
+        # type() rather than isinstance(): the latter would evaluate a lazy
+        # object (request.user) whose setup is the query being tracked
+        if issubclass(type(node), Node) and getattr(node, 'token', None) and node.origin:
+            return f"{node.origin.template_name or node.origin.name}:{node.token.lineno}"
+        filename = frame.f_code.co_filename
+        if (
+            source_line is None
+            and filename.startswith(PROJECT_DIR)
+            and filename != __file__
+            and 'site-packages' not in filename
+        ):
+            source_line = f"{os.path.relpath(filename, PROJECT_DIR)}:{frame.f_lineno}"
+        frame = frame.f_back
+    return source_line or 'unknown'
+
+
+class QueryPatternTracker:
+    """``connection.execute_wrapper`` hook that counts queries by statement"""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.origins = defaultdict(Counter)
+
+    def __call__(self, execute, sql, params, many, context):
+        self.counts[sql] += 1
+        self.origins[sql][query_origin()] += 1
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold):
+        """(count, statement, most common origin) for statements run ``threshold`` times or more"""
+        return [
+            (count, sql, self.origins[sql].most_common(1)[0][0])
+            for sql, count in self.counts.most_common()
+            if count >= threshold
+        ]
+
+
+class QueryPatternMiddleware:
+    """Log likely N+1 queries; only active when QUERY_PATTERN_DETECTION is on"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_PATTERN_DETECTION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'QUERY_PATTERN_THRESHOLD', 3)
+
+    def __call__(self, request):
+        tracker = QueryPatternTracker()
+        with connection.execute_wrapper(tracker):
+            response = self.get_response(request)
+
+        repeated = tracker.repeated(self.threshold)
+        for count, sql, origin in repeated:
+            logger.warning(f"{request.path}: query ran {count} times from {origin}: {sql}")
+        if repeated:
+            response['X-Repeated-Queries'] = str(len(repeated))
+        return response
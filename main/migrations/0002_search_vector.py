@@ -0,0 +1,76 @@
+# Generated by Django 5.2.7 on 2026-10-15 08:52
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Func, OuterRef, Subquery, TextField
+
+# main.search as it was when this migration was written, frozen so later
+# changes to it cannot change this migration
+
+
+class StripTags(Func):
+    function = 'regexp_replace'
+    template = "%(function)s(%(expressions)s, '<[^>]+>', ' ', 'g')"
+    output_field = TextField()
+
+
+def related_names(model, relation):
+    field = model._meta.get_field(relation)
+    return Subquery(
+        field.remote_field.through.objects.filter(**{field.m2m_field_name(): OuterRef('pk')})
+        .values(field.m2m_field_name())
+        .annotate(names=StringAgg(f'{field.m2m_reverse_field_name()}__name', ' '))
+        .values('names'),
+        output_field=TextField(),
+    )
+
+
+def populate_search_vectors(apps, schema_editor):
+    BlogPost = apps.get_model('main', 'BlogPost')
+    Project = apps.get_model('main', 'Project')
+    BlogPost.objects.update(search_vector=(
+        SearchVector('title', weight='A', config='english')
+        + SearchVector(related_names(BlogPost, 'tags'), weight='B', config='english')
+        + SearchVector('excerpt', weight='B', config='english')
+        + SearchVector(StripTags('content'), weight='C', config='english')
+    ))
+    Project.objects.update(search_vector=(
+        SearchVector('title', weight='A', config='english')
+        + SearchVector(related_names(Project, 'technologies'), weight='B', config='english')
+        + SearchVector('short_description', weight='B', config='english')
+        + SearchVector('description', weight='C', config='english')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='main_blogpo_search__ab61cf_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='main_projec_search__ed832b_gin'),
+        ),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+    ]
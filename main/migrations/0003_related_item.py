@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-15 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('project', 'Project'), ('post', 'Blog Post')], max_length=10)),
+                ('source_id', models.PositiveBigIntegerField()),
+                ('target_id', models.PositiveBigIntegerField()),
+                ('score', models.PositiveIntegerField(help_text='Weighted number of shared categories, tags and technologies')),
+            ],
+            options={
+                'verbose_name': 'Related Item',
+                'verbose_name_plural': 'Related Items',
+                'ordering': ['kind', 'source_id', '-score', 'target_id'],
+                'indexes': [models.Index(fields=['kind', 'source_id', '-score', 'target_id'], name='main_relate_kind_17b47a_idx'), models.Index(fields=['kind', 'target_id'], name='main_relate_kind_34a787_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'source_id', 'target_id'), name='unique_related_item')],
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.7 on 2026-10-15 08:56
+
+from django.db import migrations, models
+from django.db.models import Func, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# main.counters as it was when this migration was written, frozen so later
+# changes to it cannot change this migration
+PUBLIC_PROJECTS = {'status': 'completed'}
+PUBLIC_POSTS = {'published': True, 'status': 'published'}
+USAGE_COUNTS = {
+    'Category': {'project_count': ('projects', PUBLIC_PROJECTS), 'post_count': ('blog_posts', PUBLIC_POSTS)},
+    'Technology': {'project_count': ('projects', PUBLIC_PROJECTS)},
+    'Tag': {'post_count': ('blog_posts', PUBLIC_POSTS)},
+}
+
+
+def usage_count(model, relation, visible):
+    rel = model._meta.get_field(relation)
+    items = rel.related_model.objects.filter(**{rel.field.name: OuterRef('pk')}, **visible)
+    return Coalesce(
+        Subquery(items.order_by().annotate(
+            total=Func('pk', function='COUNT', output_field=models.IntegerField())
+        ).values('total')),
+        0,
+    )
+
+
+def populate_usage_counters(apps, schema_editor):
+    for model_name, counters in USAGE_COUNTS.items():
+        model = apps.get_model('main', model_name)
+        model.objects.update(**{
+            field: usage_count(model, relation, visible) for field, (relation, visible) in counters.items()
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_related_item'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='post_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Blog Posts'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='project_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Projects'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='post_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Blog Posts'),
+        ),
+        migrations.AddField(
+            model_name='technology',
+            name='project_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Projects'),
+        ),
+        migrations.RunPython(populate_usage_counters, migrations.RunPython.noop),
+    ]
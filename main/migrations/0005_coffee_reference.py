@@ -0,0 +1,31 @@
+import uuid
+
+from django.db import migrations, models
+
+
+def assign_references(apps, schema_editor):
+    CoffeePurchase = apps.get_model('main', 'CoffeePurchase')
+    for purchase in CoffeePurchase.objects.filter(reference__isnull=True).only('pk'):
+        purchase.reference = uuid.uuid4()
+        purchase.save(update_fields=['reference'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_usage_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coffeepurchase',
+            name='reference',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(assign_references, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='coffeepurchase',
+            name='reference',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, help_text='Public reference used for status polling and gateway callbacks', unique=True),
+        ),
+    ]
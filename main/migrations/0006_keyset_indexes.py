@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-15 08:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_coffee_reference'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['-published_at', '-id'], name='main_blogpost_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['display_order', '-created_at', '-id'], name='main_project_keyset_idx'),
+        ),
+    ]
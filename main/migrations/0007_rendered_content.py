@@ -0,0 +1,101 @@
+# Generated by Django 5.2.7 on 2026-10-15 09:01
+
+import hashlib
+import html
+import re
+
+import bleach
+from django.db import migrations, models
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+from pygments.lexers.special import TextLexer
+from pygments.util import ClassNotFound
+
+# Version 1 of main.rendering, frozen so later renderer changes cannot
+# change this migration. Bodies it stores carry the version 1 hash, so the
+# current renderer re-renders them (see the render_blog_content command).
+RENDERER_VERSION = 1
+
+ALLOWED_TAGS = bleach.sanitizer.ALLOWED_TAGS | {
+    'p', 'br', 'hr', 'div', 'span', 'pre', 'code',
+    'h2', 'h3', 'h4', 'h5', 'h6',
+    'u', 's', 'del', 'ins', 'sub', 'sup', 'mark',
+    'img', 'figure', 'figcaption',
+    'table', 'thead', 'tbody', 'tfoot', 'tr', 'th', 'td', 'caption',
+}
+ALLOWED_ATTRIBUTES = {
+    '*': ['class', 'id', 'title'],
+    'a': ['href', 'title', 'rel', 'target'],
+    'img': ['src', 'alt', 'title', 'width', 'height'],
+    'th': ['colspan', 'rowspan', 'scope'],
+    'td': ['colspan', 'rowspan'],
+}
+
+CODE_BLOCK_RE = re.compile(
+    r'<pre(?P<pre_attrs>[^>]*)>\s*(?:<code(?P<code_attrs>[^>]*)>)?(?P<code>.*?)(?:</code>)?\s*</pre>',
+    re.DOTALL | re.IGNORECASE,
+)
+LANGUAGE_RE = re.compile(r'\blang(?:uage)?-([\w+#-]+)')
+TAG_RE = re.compile(r'<[^>]+>')
+
+COPY_BUTTON = (
+    '<button type="button" class="copy-btn" aria-label="Copy code">'
+    '<svg width="16" height="16" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" aria-hidden="true">'
+    '<rect x="9" y="9" width="13" height="13" rx="2" ry="2"></rect>'
+    '<path d="M5 15H4a2 2 0 0 1-2-2V4a2 2 0 0 1 2-2h9a2 2 0 0 1 2 2v1"></path>'
+    '</svg>Copy</button>'
+)
+
+
+def render_code_block(match):
+    attrs = f"{match['pre_attrs']} {match['code_attrs'] or ''}"
+    language_match = LANGUAGE_RE.search(attrs)
+    language = language_match.group(1).lower() if language_match else ''
+    code = html.unescape(TAG_RE.sub('', match['code']))
+    try:
+        lexer = get_lexer_by_name(language) if language else TextLexer()
+    except ClassNotFound:
+        lexer = TextLexer()
+    label = html.escape(language.upper() or 'CODE')
+    return (
+        '<div class="code-container">'
+        '<div class="code-header">'
+        f'<div class="code-language"><span class="language-dot"></span><span class="language-name">{label}</span></div>'
+        f'{COPY_BUTTON}'
+        '</div>'
+        f'<pre class="code-block highlight"><code>{highlight(code, lexer, HtmlFormatter(nowrap=True))}</code></pre>'
+        '</div>'
+    )
+
+
+def populate_rendered_content(apps, schema_editor):
+    BlogPost = apps.get_model('main', 'BlogPost')
+    posts = []
+    for post in BlogPost.objects.only('pk', 'content').iterator():
+        cleaned = bleach.clean(post.content or '', tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES, strip=True)
+        post.rendered_content = CODE_BLOCK_RE.sub(render_code_block, cleaned)
+        post.rendered_content_hash = hashlib.sha256(f'{RENDERER_VERSION}:{post.content}'.encode()).hexdigest()
+        posts.append(post)
+    BlogPost.objects.bulk_update(posts, ['rendered_content', 'rendered_content_hash'], batch_size=100)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='rendered_content',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='rendered_content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.RunPython(populate_rendered_content, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 5.2.7 on 2026-10-15 09:02
+
+from html.parser import HTMLParser
+
+from django.db import migrations, models
+
+# main.analysis as it was when this migration was written, frozen so later
+# changes to it cannot change this migration
+WORDS_PER_MINUTE = 200
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt',
+    'figcaption', 'figure', 'footer', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'header', 'hr', 'li', 'ol', 'p', 'pre', 'section', 'table', 'td', 'th',
+    'tr', 'ul',
+}
+SKIPPED_TAGS = {'script', 'style', 'template'}
+
+
+class TextAnalyzer(HTMLParser):
+    def __init__(self, keep_chars):
+        super().__init__(convert_charrefs=True)
+        self.keep_chars = keep_chars
+        self.word_count = 0
+        self.words = []
+        self.kept = 0
+        self.in_word = False
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skipping += 1
+        elif tag in BLOCK_TAGS:
+            self.in_word = False
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self.skipping = max(0, self.skipping - 1)
+        elif tag in BLOCK_TAGS:
+            self.in_word = False
+
+    def handle_data(self, data):
+        if self.skipping or not data:
+            return
+        parts = data.split()
+        if not parts:
+            self.in_word = False
+            return
+        continues = self.in_word and not data[0].isspace()
+        self.word_count += len(parts) - continues
+        self.in_word = not data[-1].isspace()
+        if self.kept <= self.keep_chars:
+            if continues and self.words:
+                self.words[-1] += parts.pop(0)
+            for part in parts:
+                self.words.append(part)
+                self.kept += len(part) + 1
+                if self.kept > self.keep_chars:
+                    break
+
+
+def truncate_text(text, length):
+    text = ' '.join(text.split())
+    if len(text) <= length:
+        return text
+    cut = text[:length - 1].rsplit(' ', 1)[0]
+    return f'{cut.rstrip(",.;:")}…'
+
+
+def populate_content_analysis(apps, schema_editor):
+    BlogPost = apps.get_model('main', 'BlogPost')
+    posts = []
+    for post in BlogPost.objects.only('pk', 'content', 'excerpt', 'meta_description').iterator():
+        analyzer = TextAnalyzer(keep_chars=500)
+        analyzer.feed(post.content or '')
+        analyzer.close()
+        post.word_count = analyzer.word_count
+        post.reading_time = max(1, round(analyzer.word_count / WORDS_PER_MINUTE))
+        # Excerpts generated by slicing the raw HTML are replaced with clean text
+        if post.excerpt == post.content[:500]:
+            excerpt = truncate_text(' '.join(analyzer.words), 500)
+            if post.meta_description == post.excerpt[:300]:
+                post.meta_description = truncate_text(excerpt, 300)
+            post.excerpt = excerpt
+        posts.append(post)
+    BlogPost.objects.bulk_update(posts, ['word_count', 'reading_time', 'excerpt', 'meta_description'], batch_size=100)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_rendered_content'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Words in the post body, counted when it is saved'),
+        ),
+        migrations.AlterField(
+            model_name='blogpost',
+            name='reading_time',
+            field=models.PositiveIntegerField(default=5, editable=False, help_text='Estimated reading time in minutes, derived from the word count'),
+        ),
+        migrations.RunPython(populate_content_analysis, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-15 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_content_analysis'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized AVIF/WebP copies of the featured image (see main.images)'),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized AVIF/WebP copies of the images (see main.images)'),
+        ),
+    ]
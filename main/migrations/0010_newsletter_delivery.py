@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-15 09:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_image_variants'),
+        ('newsletter', '0014_article_image_below_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsletterDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+                ('status', models.CharField(choices=[('sending', 'Sending'), ('sent', 'Sent'), ('partial', 'Sent with failures')], db_index=True, default='sending', max_length=10)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('sent_count', models.PositiveIntegerField(default=0)),
+                ('failed_count', models.PositiveIntegerField(default=0)),
+                ('failed_recipients', models.JSONField(blank=True, default=list)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('submission', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='delivery', to='newsletter.submission')),
+            ],
+            options={
+                'verbose_name': 'Newsletter Delivery',
+                'verbose_name_plural': 'Newsletter Deliveries',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-15 09:35
+
+from django.db import migrations, models
+
+
+def create_partitions(apps, schema_editor):
+    from main.analytics import create_page_view_partitions
+
+    create_page_view_partitions(connection=schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_newsletter_delivery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageView',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('event_id', models.CharField(help_text='Redis stream entry the view was read from', max_length=32)),
+                ('viewed_at', models.DateTimeField()),
+                ('path', models.CharField(max_length=500)),
+                ('referrer', models.CharField(blank=True, max_length=500)),
+                ('device', models.CharField(choices=[('desktop', 'Desktop'), ('mobile', 'Mobile'), ('tablet', 'Tablet'), ('bot', 'Bot'), ('unknown', 'Unknown')], max_length=10)),
+            ],
+            options={
+                'verbose_name': 'Page View',
+                'verbose_name_plural': 'Page Views',
+                'db_table': 'main_pageview',
+                'ordering': ['-viewed_at'],
+                'managed': False,
+            },
+        ),
+        # Append-only and range-partitioned by month. Postgres requires the
+        # partition key in every unique constraint, hence the composite keys;
+        # bigserial because identity columns on partitioned tables need 17+.
+        migrations.RunSQL(
+            sql=[
+                """
+                CREATE TABLE main_pageview (
+                    id bigserial NOT NULL,
+                    event_id varchar(32) NOT NULL,
+                    viewed_at timestamp with time zone NOT NULL,
+                    path varchar(500) NOT NULL,
+                    referrer varchar(500) NOT NULL,
+                    device varchar(10) NOT NULL,
+                    PRIMARY KEY (id, viewed_at),
+                    UNIQUE (event_id, viewed_at)
+                ) PARTITION BY RANGE (viewed_at)
+                """,
+                "CREATE TABLE main_pageview_default PARTITION OF main_pageview DEFAULT",
+                # Rows arrive in time order, so a BRIN index stays tiny
+                "CREATE INDEX main_pageview_viewed_at_brin ON main_pageview USING brin (viewed_at)",
+                "CREATE INDEX main_pageview_path_viewed_at ON main_pageview (path, viewed_at)",
+            ],
+            reverse_sql="DROP TABLE main_pageview CASCADE",
+        ),
+        migrations.RunPython(create_partitions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-15 09:39
+
+from django.db import migrations, models
+
+from main.revenue import rebuild_revenue_rollups
+
+
+def backfill_rollups(apps, schema_editor):
+    rebuild_revenue_rollups(
+        purchase_model=apps.get_model('main', 'CoffeePurchase'),
+        rollup_model=apps.get_model('main', 'DailyCoffeeRevenue'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_page_views'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCoffeeRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('currency', models.CharField(max_length=3)),
+                ('payment_method', models.CharField(choices=[('mpesa', 'M-Pesa'), ('paypal', 'PayPal'), ('card', 'Credit Card'), ('bank', 'Bank Transfer')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('purchases', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Daily Coffee Revenue',
+                'verbose_name_plural': 'Daily Coffee Revenue',
+                'ordering': ['-date', 'currency', 'payment_method'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'currency', 'payment_method'), name='unique_daily_coffee_revenue')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
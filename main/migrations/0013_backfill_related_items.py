@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-15 09:51
+
+from django.db import migrations
+
+from main.related import rebuild_related_items
+
+
+def backfill_related_items(apps, schema_editor):
+    related_model = apps.get_model('main', 'RelatedItem')
+    for kind, model_name in (('project', 'Project'), ('post', 'BlogPost')):
+        rebuild_related_items(kind, model=apps.get_model('main', model_name), related_model=related_model)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_coffee_revenue_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_related_items, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,11 @@
+import uuid
+
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.utils.html import strip_tags
 from django.utils.text import slugify
 from django.urls import reverse
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -8,6 +13,9 @@ from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 from tinymce.models import HTMLField
 
+from .analysis import analyze_content, truncate_text
+from .rendering import content_hash, render_content
+
 class TimeStampedModel(models.Model):
     """Abstract base model for created/updated timestamps"""
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
@@ -24,6 +32,14 @@ class Category(TimeStampedModel):
     color = models.CharField(max_length=7, default='#3B82F6', help_text="Hex color code for UI")
     icon = models.CharField(max_length=50, default='fas fa-folder', help_text="Font Awesome icon class")
     
+    # Denormalized usage counters, kept current by main.signals
+    project_count = models.PositiveIntegerField(
+        default=0, editable=False, db_index=True, verbose_name=_("Projects")
+    )
+    post_count = models.PositiveIntegerField(
+        default=0, editable=False, db_index=True, verbose_name=_("Blog Posts")
+    )
+    
     class Meta:
         verbose_name = _("Category")
         verbose_name_plural = _("Categories")
@@ -38,7 +54,7 @@ class Category(TimeStampedModel):
         super().save(*args, **kwargs)
     
     def get_absolute_url(self):
-        return reverse('category_detail', kwargs={'slug': self.slug})
+        return reverse('category_posts', kwargs={'slug': self.slug})
 
 class Technology(TimeStampedModel):
     """Model for technology stack items"""
@@ -59,6 +75,11 @@ class Technology(TimeStampedModel):
         default='tool'
     )
     
+    # Denormalized usage counter, kept current by main.signals
+    project_count = models.PositiveIntegerField(
+        default=0, editable=False, db_index=True, verbose_name=_("Projects")
+    )
+    
     class Meta:
         verbose_name = _("Technology")
         verbose_name_plural = _("Technologies")
@@ -119,6 +140,12 @@ class Project(TimeStampedModel):
         null=True,
         help_text=_("Featured project image for highlights")
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text=_("Resized AVIF/WebP copies of the images (see main.images)")
+    )
     
     # Relationships
     categories = models.ManyToManyField(
@@ -189,6 +216,12 @@ class Project(TimeStampedModel):
         help_text=_("Client name (if applicable)")
     )
     
+    # Search
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False
+    )
+    
     class Meta:
         verbose_name = _("Project")
         verbose_name_plural = _("Projects")
@@ -197,6 +230,8 @@ class Project(TimeStampedModel):
             models.Index(fields=['featured', 'status']),
             models.Index(fields=['created_at']),
             models.Index(fields=['slug']),
+            models.Index(fields=['display_order', '-created_at', '-id'], name='main_project_keyset_idx'),
+            GinIndex(fields=['search_vector']),
         ]
     
     def __str__(self):
@@ -296,6 +331,12 @@ class BlogPost(TimeStampedModel):
         blank=True,
         help_text=_("Alt text for the featured image")
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text=_("Resized AVIF/WebP copies of the featured image (see main.images)")
+    )
     
     # Publication details
     status = models.CharField(
@@ -338,9 +379,32 @@ class BlogPost(TimeStampedModel):
         default=0,
         help_text=_("Number of times this post has been viewed")
     )
+    word_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text=_("Words in the post body, counted when it is saved")
+    )
     reading_time = models.PositiveIntegerField(
         default=5,
-        help_text=_("Estimated reading time in minutes")
+        editable=False,
+        help_text=_("Estimated reading time in minutes, derived from the word count")
+    )
+    
+    # Sanitized, highlighted body rendered at save time (see main.rendering)
+    rendered_content = models.TextField(
+        blank=True,
+        editable=False
+    )
+    rendered_content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False
+    )
+    
+    # Search
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False
     )
     
     class Meta:
@@ -352,6 +416,8 @@ class BlogPost(TimeStampedModel):
             models.Index(fields=['published_at']),
             models.Index(fields=['slug']),
             models.Index(fields=['featured']),
+            models.Index(fields=['-published_at', '-id'], name='main_blogpost_keyset_idx'),
+            GinIndex(fields=['search_vector']),
         ]
         constraints = [
             models.UniqueConstraint(
@@ -371,13 +437,29 @@ class BlogPost(TimeStampedModel):
         if self.published and self.status == 'published' and not self.published_at:
             self.published_at = timezone.now()
         
+        # Re-render and re-analyze the body only when its content has changed
+        stats = None
+        if 'content' not in self.get_deferred_fields():
+            digest = content_hash(self.content)
+            if digest != self.rendered_content_hash:
+                stats = analyze_content(self.content)
+                self.rendered_content = render_content(self.content)
+                self.rendered_content_hash = digest
+                self.word_count = stats.word_count
+                self.reading_time = stats.reading_time
+                if kwargs.get('update_fields') is not None:
+                    kwargs['update_fields'] = {
+                        *kwargs['update_fields'],
+                        'rendered_content', 'rendered_content_hash', 'word_count', 'reading_time',
+                    }
+        
         # Auto-generate excerpt if empty
         if not self.excerpt and self.content:
-            self.excerpt = self.content[:500]
+            self.excerpt = (stats or analyze_content(self.content)).excerpt
         
         # Auto-generate meta description if empty
         if not self.meta_description and self.excerpt:
-            self.meta_description = self.excerpt[:300]
+            self.meta_description = truncate_text(strip_tags(self.excerpt), 300)
         
         super().save(*args, **kwargs)
     
@@ -389,16 +471,15 @@ class BlogPost(TimeStampedModel):
         return self.published and self.status == 'published' and self.published_at is not None
     
     def increment_view_count(self):
-        """Increment the view count for this post"""
+        """Increment the view count for this post in a single atomic UPDATE"""
+        BlogPost.objects.filter(pk=self.pk).update(view_count=models.F('view_count') + 1)
         self.view_count += 1
-        self.save(update_fields=['view_count'])
     
     @property
-    def estimated_reading_time(self):
-        """Calculate reading time based on word count"""
-        word_count = len(self.content.split())
-        reading_time = max(1, round(word_count / 200))  # 200 words per minute
-        return reading_time
+    def total_view_count(self):
+        """Stored view count plus views not yet flushed from the counter buffer"""
+        return self.view_count + getattr(self, 'pending_views', 0)
+    
 
 class Tag(TimeStampedModel):
     """Model for blog post tags"""
@@ -406,6 +487,11 @@ class Tag(TimeStampedModel):
     slug = models.SlugField(max_length=50, unique=True)
     description = models.TextField(blank=True)
     
+    # Denormalized usage counter, kept current by main.signals
+    post_count = models.PositiveIntegerField(
+        default=0, editable=False, db_index=True, verbose_name=_("Blog Posts")
+    )
+    
     class Meta:
         verbose_name = _("Tag")
         verbose_name_plural = _("Tags")
@@ -420,7 +506,7 @@ class Tag(TimeStampedModel):
         super().save(*args, **kwargs)
     
     def get_absolute_url(self):
-        return reverse('tag_detail', kwargs={'slug': self.slug})
+        return reverse('tag_posts', kwargs={'slug': self.slug})
 
 class CoffeePurchase(TimeStampedModel):
     """Enhanced Coffee Purchase model with payment tracking"""
@@ -474,6 +560,12 @@ class CoffeePurchase(TimeStampedModel):
     )
     
     # Transaction tracking
+    reference = models.UUIDField(
+        default=uuid.uuid4,
+        unique=True,
+        editable=False,
+        help_text=_("Public reference used for status polling and gateway callbacks")
+    )
     transaction_id = models.CharField(
         max_length=100,
         blank=True,
@@ -569,6 +661,31 @@ class CoffeePurchase(TimeStampedModel):
         coffee_price = 3.00  # $3 per coffee
         return int(self.amount / coffee_price)
 
+
+class DailyCoffeeRevenue(models.Model):
+    """Paid coffee purchases summed per day, currency and method; kept by main.revenue"""
+    
+    date = models.DateField()
+    currency = models.CharField(max_length=3)
+    payment_method = models.CharField(max_length=20, choices=CoffeePurchase.PAYMENT_METHOD)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    purchases = models.IntegerField(default=0)
+    
+    class Meta:
+        verbose_name = _("Daily Coffee Revenue")
+        verbose_name_plural = _("Daily Coffee Revenue")
+        ordering = ['-date', 'currency', 'payment_method']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'currency', 'payment_method'],
+                name='unique_daily_coffee_revenue'
+            )
+        ]
+    
+    def __str__(self):
+        return f"{self.date} {self.payment_method}: {self.amount} {self.currency}"
+
+
 class SiteSettings(models.Model):
     """Model for site-wide settings"""
     site_name = models.CharField(max_length=100, default="Marube Snipher Abel")
@@ -608,4 +725,112 @@ class SiteSettings(models.Model):
     def load(cls):
         """Load or create site settings"""
         obj, created = cls.objects.get_or_create(pk=1)
-        return obj
\ No newline at end of file
+        return obj
+
+
+class RelatedItem(models.Model):
+    """Precomputed related-content ranking, rebuilt by main.related"""
+    
+    ITEM_KIND = [
+        ('project', _('Project')),
+        ('post', _('Blog Post')),
+    ]
+    
+    kind = models.CharField(max_length=10, choices=ITEM_KIND)
+    source_id = models.PositiveBigIntegerField()
+    target_id = models.PositiveBigIntegerField()
+    score = models.PositiveIntegerField(
+        help_text=_("Weighted number of shared categories, tags and technologies")
+    )
+    
+    class Meta:
+        verbose_name = _("Related Item")
+        verbose_name_plural = _("Related Items")
+        ordering = ['kind', 'source_id', '-score', 'target_id']
+        indexes = [
+            models.Index(fields=['kind', 'source_id', '-score', 'target_id']),
+            models.Index(fields=['kind', 'target_id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['kind', 'source_id', 'target_id'],
+                name='unique_related_item'
+            )
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} {self.source_id} -> {self.target_id} ({self.score})"
+
+
+class NewsletterDelivery(TimeStampedModel):
+    """Progress of one newsletter submission through main.mailing"""
+    
+    DELIVERY_STATUS = [
+        ('sending', _('Sending')),
+        ('sent', _('Sent')),
+        ('partial', _('Sent with failures')),
+    ]
+    
+    submission = models.OneToOneField(
+        'newsletter.Submission',
+        on_delete=models.CASCADE,
+        related_name='delivery'
+    )
+    status = models.CharField(max_length=10, choices=DELIVERY_STATUS, default='sending', db_index=True)
+    total = models.PositiveIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    failed_recipients = models.JSONField(default=list, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = _("Newsletter Delivery")
+        verbose_name_plural = _("Newsletter Deliveries")
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.submission} - {self.sent_count}/{self.total}"
+    
+    @property
+    def progress(self):
+        """Share of recipients handled so far, as a percentage"""
+        if not self.total:
+            return 100
+        return round(100 * (self.sent_count + self.failed_count) / self.total)
+
+
+class PageView(models.Model):
+    """
+    One public page view, appended by main.analytics.
+
+    The table is range-partitioned by month on ``viewed_at`` in migration
+    0011, which Django cannot express, so it is not managed here.
+    """
+    
+    DEVICE_CLASSES = [
+        ('desktop', _('Desktop')),
+        ('mobile', _('Mobile')),
+        ('tablet', _('Tablet')),
+        ('bot', _('Bot')),
+        ('unknown', _('Unknown')),
+    ]
+    
+    id = models.BigAutoField(primary_key=True)
+    event_id = models.CharField(
+        max_length=32,
+        help_text=_("Redis stream entry the view was read from")
+    )
+    viewed_at = models.DateTimeField()
+    path = models.CharField(max_length=500)
+    referrer = models.CharField(max_length=500, blank=True)
+    device = models.CharField(max_length=10, choices=DEVICE_CLASSES)
+    
+    class Meta:
+        managed = False
+        db_table = 'main_pageview'
+        verbose_name = _("Page View")
+        verbose_name_plural = _("Page Views")
+        ordering = ['-viewed_at']
+    
+    def __str__(self):
+        return f"{self.path} ({self.viewed_at:%Y-%m-%d %H:%M})"
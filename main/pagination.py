@@ -0,0 +1,157 @@
+"""
+Keyset (cursor) pagination for the public listings.
+
+Offset pagination counts the whole filtered result on every request and
+makes the database skip every row before a deep page. A cursor instead
+remembers the sort key of the last row shown, so each page is a single
+indexed range scan of ``per_page + 1`` rows however far in the reader is.
+"""
+import base64
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Keep full microsecond precision; a rounded key would skip rows"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class CursorPage:
+    """One page of a cursor paginated listing, shaped like Django's Page"""
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginate a queryset on a unique ordering such as ``('-published_at', '-id')``.
+
+    Cursors are opaque, URL-safe tokens holding the ordering values of the
+    row a page starts after (or, going back, before).
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [name.lstrip('-') for name in self.ordering]
+
+    def encode_cursor(self, obj, backwards=False):
+        values = [getattr(obj, name) for name in self.fields]
+        payload = json.dumps({'v': values, 'b': backwards}, cls=CursorEncoder)
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            values = [
+                self.queryset.model._meta.get_field(name).to_python(value)
+                for name, value in zip(self.fields, payload['v'], strict=True)
+            ]
+            return values, bool(payload.get('b'))
+        except Exception as e:
+            raise InvalidCursor(cursor) from e
+
+    def keyset_filter(self, values, backwards):
+        """Rows strictly after ``values`` in the ordering (before, going back)"""
+        condition = Q()
+        for position, name in enumerate(self.ordering):
+            descending = name.startswith('-')
+            lookup = 'lt' if descending != backwards else 'gt'
+            step = Q(**dict(zip(self.fields[:position], values)))
+            step &= Q(**{f'{self.fields[position]}__{lookup}': values[position]})
+            condition |= step
+        if values[0] is not None:
+            # Postgres cannot seek an index on the OR above; a plain bound on
+            # the leading column lets the scan start at the cursor
+            descending = self.ordering[0].startswith('-')
+            lookup = 'lte' if descending != backwards else 'gte'
+            condition &= Q(**{f'{self.fields[0]}__{lookup}': values[0]})
+        return condition
+
+    def page(self, cursor=None):
+        queryset = self.queryset
+        backwards = False
+        if cursor:
+            values, backwards = self.decode_cursor(cursor)
+            queryset = queryset.filter(self.keyset_filter(values, backwards))
+
+        ordering = self.ordering
+        if backwards:
+            ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in ordering]
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return CursorPage(rows, self)
+        more_after = has_more if not backwards else True
+        more_before = has_more if backwards else bool(cursor)
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=self.encode_cursor(rows[-1]) if more_after else None,
+            previous_cursor=self.encode_cursor(rows[0], backwards=True) if more_before else None,
+        )
+
+
+class CursorPaginationMixin:
+    """
+    Cursor pagination for a ListView.
+
+    ``cursor_ordering`` must end in a unique column. Views can return False
+    from ``use_cursor_pagination`` (e.g. for relevance-ranked searches) to
+    fall back to the regular ``?page=`` paginator.
+    """
+    cursor_ordering = ('-id',)
+    cursor_kwarg = 'cursor'
+
+    def use_cursor_pagination(self):
+        return True
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = CursorPaginator(queryset, self.cursor_ordering, page_size)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404("Invalid cursor.")
+        return paginator, page, page.object_list, page.has_other_pages()
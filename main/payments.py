@@ -0,0 +1,96 @@
+"""
+Coffee payment processing.
+
+Requests never talk to the payment provider. The purchase view saves a
+pending CoffeePurchase and queues ``process_coffee_payment``; the task starts
+the charge through the configured gateway, and the result is applied either
+straight away or when the provider calls ``coffee_webhook``. Both paths end in
+``finalize_payment``, which is idempotent.
+"""
+import hashlib
+import hmac
+import logging
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import CoffeePurchase
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentGatewayError(Exception):
+    """The gateway could not be reached or refused the request; safe to retry"""
+
+
+@dataclass
+class PaymentResult:
+    status: str  # 'completed', 'pending' (wait for the webhook) or 'failed'
+    transaction_id: str = ''
+    mpesa_code: str = ''
+
+
+class FakeGateway:
+    """
+    Local stand-in for a real provider, used in development and tests.
+
+    ``outcome`` decides what every charge returns; set it to 'pending' to
+    exercise the webhook path.
+    """
+    outcome = 'completed'
+
+    def charge(self, purchase):
+        reference = purchase.reference.hex[:12].upper()
+        if self.outcome == 'error':
+            raise PaymentGatewayError("Fake gateway unavailable")
+        return PaymentResult(
+            status=self.outcome,
+            transaction_id=f"FAKE-{reference}",
+            mpesa_code=f"MPE{reference[:7]}" if purchase.payment_method == 'mpesa' else '',
+        )
+
+
+def get_gateway():
+    return import_string(settings.PAYMENT_GATEWAY)()
+
+
+def sign_payload(body):
+    """HMAC signature a gateway sends with each webhook body"""
+    return hmac.new(settings.PAYMENT_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body, signature):
+    if not settings.PAYMENT_WEBHOOK_SECRET:
+        return False
+    return hmac.compare_digest(sign_payload(body), signature or '')
+
+
+def finalize_payment(reference, result):
+    """Apply a gateway result to a purchase; repeated calls are harmless"""
+    with transaction.atomic():
+        purchase = CoffeePurchase.objects.select_for_update().get(reference=reference)
+        if purchase.is_paid or result.status == 'pending':
+            return purchase
+
+        if result.status == 'completed':
+            purchase.mark_as_paid(
+                transaction_id=result.transaction_id,
+                mpesa_code=result.mpesa_code,
+            )
+        else:
+            purchase.payment_status = 'failed'
+            if result.transaction_id:
+                purchase.transaction_id = result.transaction_id
+            purchase.save(update_fields=['payment_status', 'transaction_id', 'updated_at'])
+        logger.info(f"Payment {purchase.reference} finalized as {purchase.payment_status}")
+        return purchase
+
+
+def fail_payment(purchase_id):
+    """Give up on a purchase the gateway never answered, so its page stops waiting"""
+    return CoffeePurchase.objects.filter(pk=purchase_id, is_paid=False, payment_status='pending').update(
+        payment_status='failed', updated_at=timezone.now()
+    )
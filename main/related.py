@@ -0,0 +1,123 @@
+"""
+Materialized related-content rankings.
+
+Two items are related when they share categories, tags or technologies.
+Each shared relation adds its weight to the pair's score, and the best
+``RELATED_ITEMS_PER_SOURCE`` neighbours of every item are stored in
+RelatedItem, so detail pages read them with one indexed lookup.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import BlogPost, Project, RelatedItem
+
+RELATED_ITEMS_PER_SOURCE = 12
+
+RELATED_KINDS = {
+    'project': {
+        'model': Project,
+        'weights': {'categories': 1, 'technologies': 2},
+        'visible': {'status': 'completed'},
+    },
+    'post': {
+        'model': BlogPost,
+        'weights': {'categories': 1, 'tags': 2},
+        'visible': {'published': True, 'status': 'published'},
+    },
+}
+
+
+def kind_for(instance):
+    """Return the RelatedItem kind for a Project or BlogPost"""
+    for kind, config in RELATED_KINDS.items():
+        if isinstance(instance, config['model']):
+            return kind
+    raise ValueError(f"{instance!r} has no related items")
+
+
+def compute_scores(kind, source_id, model=None):
+    """Score every visible item that shares something with the source"""
+    config = RELATED_KINDS[kind]
+    model = model or config['model']
+    scores = Counter()
+    for relation, weight in config['weights'].items():
+        field = model._meta.get_field(relation)
+        shared = field.remote_field.through.objects.filter(
+            **{field.m2m_field_name(): source_id}
+        ).values(field.m2m_reverse_field_name())
+        neighbours = (
+            model.objects.filter(**config['visible'], **{f'{relation}__in': shared})
+            .exclude(pk=source_id)
+            .values('pk')
+            .annotate(shared=Count('pk'))
+        )
+        for row in neighbours:
+            scores[row['pk']] += row['shared'] * weight
+    return scores
+
+
+def rebuild_source(kind, source_id, model=None, related_model=RelatedItem):
+    """
+    Replace the stored neighbours of one item.
+
+    The source row is locked first, so two workers rebuilding the same
+    item take turns instead of both inserting its rows.
+    """
+    model = model or RELATED_KINDS[kind]['model']
+    with transaction.atomic():
+        list(model.objects.select_for_update().filter(pk=source_id).values_list('pk'))
+        scores = compute_scores(kind, source_id, model)
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:RELATED_ITEMS_PER_SOURCE]
+        related_model.objects.filter(kind=kind, source_id=source_id).delete()
+        related_model.objects.bulk_create([
+            related_model(kind=kind, source_id=source_id, target_id=target_id, score=score)
+            for target_id, score in best
+        ])
+    return scores
+
+
+def rebuild_related_items(kind, source_ids=None, model=None, related_model=RelatedItem):
+    """
+    Rebuild the rankings affected by changes to the given items.
+
+    Scores are symmetric, so every item that lists a changed item, or that
+    shares something with it now, is rebuilt along with it. Passing no ids
+    rebuilds every item of the kind; migrations pass their historical
+    ``model`` and ``related_model``.
+    """
+    model = model or RELATED_KINDS[kind]['model']
+    if source_ids is None:
+        related_model.objects.filter(kind=kind).delete()
+        for source_id in model.objects.values_list('pk', flat=True):
+            rebuild_source(kind, source_id, model, related_model)
+        return
+
+    affected = set(
+        RelatedItem.objects.filter(kind=kind, target_id__in=source_ids)
+        .values_list('source_id', flat=True)
+    )
+    for source_id in source_ids:
+        if model.objects.filter(pk=source_id).exists():
+            affected.update(rebuild_source(kind, source_id))
+        else:
+            remove_related_items(kind, source_id)
+    for source_id in affected.difference(source_ids):
+        rebuild_source(kind, source_id)
+
+
+def remove_related_items(kind, item_id):
+    """Forget an item that no longer exists"""
+    RelatedItem.objects.filter(kind=kind, source_id=item_id).delete()
+    RelatedItem.objects.filter(kind=kind, target_id=item_id).delete()
+
+
+def get_related(instance, queryset, limit):
+    """Return up to ``limit`` related items from ``queryset``, best first"""
+    target_ids = list(
+        RelatedItem.objects.filter(kind=kind_for(instance), source_id=instance.pk)
+        .values_list('target_id', flat=True)[:limit]
+    )
+    items = queryset.in_bulk(target_ids)
+    return [items[target_id] for target_id in target_ids if target_id in items]
@@ -0,0 +1,156 @@
+"""
+Save-time rendering of blog post bodies.
+
+Post content arrives from TinyMCE as raw HTML. Before it is stored for
+display it is sanitized with bleach, and every code block is highlighted
+with Pygments and wrapped in the code-container markup (language label and
+copy button) that ``static/js/code-copy.js`` used to build in the browser.
+The result is kept on the post next to a hash of the content it came from,
+so pages serve it as-is and only edited posts are rendered again.
+"""
+import hashlib
+import html
+import re
+from urllib.parse import urlsplit
+
+import bleach
+from bleach.css_sanitizer import CSSSanitizer
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+from pygments.lexers.special import TextLexer
+from pygments.util import ClassNotFound
+
+# Bump when the rendering below changes so stored bodies are rebuilt
+RENDERER_VERSION = 2
+
+# What TinyMCE produces is kept; anything else is dropped on purpose:
+# scripts, styles, forms and event handlers; iframes from hosts outside
+# EMBED_HOSTS; data: URIs other than pasted raster images (SVG can carry
+# script); and inline CSS beyond ALLOWED_CSS_PROPERTIES (e.g. position,
+# which could lay a post over the rest of the page).
+ALLOWED_TAGS = bleach.sanitizer.ALLOWED_TAGS | {
+    'p', 'br', 'hr', 'div', 'span', 'pre', 'code',
+    'h2', 'h3', 'h4', 'h5', 'h6',
+    'u', 's', 'del', 'ins', 'sub', 'sup', 'mark',
+    'img', 'figure', 'figcaption', 'iframe',
+    'table', 'thead', 'tbody', 'tfoot', 'tr', 'th', 'td', 'caption',
+}
+ALLOWED_PROTOCOLS = bleach.sanitizer.ALLOWED_PROTOCOLS | {'data'}
+ALLOWED_CSS_PROPERTIES = [
+    'text-align', 'vertical-align', 'float', 'display',
+    'margin-left', 'margin-right', 'width', 'height', 'max-width',
+    'color', 'background-color',
+]
+EMBED_HOSTS = {'www.youtube.com', 'www.youtube-nocookie.com', 'player.vimeo.com'}
+DATA_IMAGE_RE = re.compile(r'data:image/(?:png|jpeg|gif|webp);base64,', re.IGNORECASE)
+
+css_sanitizer = CSSSanitizer(allowed_css_properties=ALLOWED_CSS_PROPERTIES)
+
+GLOBAL_ATTRIBUTES = ('class', 'id', 'title', 'style')
+
+
+def allow_link_attribute(tag, name, value):
+    if name == 'href':
+        return not value.strip().lower().startswith('data:')
+    return name in GLOBAL_ATTRIBUTES or name in ('rel', 'target')
+
+
+def allow_image_attribute(tag, name, value):
+    if name == 'src' and value.strip().lower().startswith('data:'):
+        # Images pasted into the editor are inlined as base64
+        return bool(DATA_IMAGE_RE.match(value.strip()))
+    return name in GLOBAL_ATTRIBUTES or name in ('src', 'alt', 'width', 'height')
+
+
+def allow_embed_attribute(tag, name, value):
+    if name == 'src':
+        url = urlsplit(value.strip())
+        return url.scheme == 'https' and url.hostname in EMBED_HOSTS
+    return name in GLOBAL_ATTRIBUTES or name in (
+        'width', 'height', 'allow', 'allowfullscreen', 'frameborder', 'loading',
+    )
+
+
+# A callable replaces the '*' list for its tag, so each one allows GLOBAL_ATTRIBUTES too
+ALLOWED_ATTRIBUTES = {
+    '*': list(GLOBAL_ATTRIBUTES),
+    'a': allow_link_attribute,
+    'img': allow_image_attribute,
+    'iframe': allow_embed_attribute,
+    'th': ['colspan', 'rowspan', 'scope'],
+    'td': ['colspan', 'rowspan'],
+}
+
+CODE_BLOCK_RE = re.compile(
+    r'<pre(?P<pre_attrs>[^>]*)>\s*(?:<code(?P<code_attrs>[^>]*)>)?(?P<code>.*?)(?:</code>)?\s*</pre>',
+    re.DOTALL | re.IGNORECASE,
+)
+LANGUAGE_RE = re.compile(r'\blang(?:uage)?-([\w+#-]+)')
+TAG_RE = re.compile(r'<[^>]+>')
+
+COPY_BUTTON = (
+    '<button type="button" class="copy-btn" aria-label="Copy code">'
+    '<svg width="16" height="16" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" aria-hidden="true">'
+    '<rect x="9" y="9" width="13" height="13" rx="2" ry="2"></rect>'
+    '<path d="M5 15H4a2 2 0 0 1-2-2V4a2 2 0 0 1 2-2h9a2 2 0 0 1 2 2v1"></path>'
+    '</svg>Copy</button>'
+)
+
+formatter = HtmlFormatter(nowrap=True)
+
+
+def content_hash(content):
+    """Fingerprint of a body as seen by the current renderer"""
+    return hashlib.sha256(f'{RENDERER_VERSION}:{content}'.encode()).hexdigest()
+
+
+def get_lexer(language):
+    try:
+        return get_lexer_by_name(language)
+    except ClassNotFound:
+        return TextLexer()
+
+
+def render_code_block(match):
+    attrs = f"{match['pre_attrs']} {match['code_attrs'] or ''}"
+    language_match = LANGUAGE_RE.search(attrs)
+    language = language_match.group(1).lower() if language_match else ''
+    code = html.unescape(TAG_RE.sub('', match['code']))
+    lexer = get_lexer(language) if language else TextLexer()
+    label = html.escape(language.upper() or 'CODE')
+    return (
+        '<div class="code-container">'
+        '<div class="code-header">'
+        f'<div class="code-language"><span class="language-dot"></span><span class="language-name">{label}</span></div>'
+        f'{COPY_BUTTON}'
+        '</div>'
+        f'<pre class="code-block highlight"><code>{highlight(code, lexer, formatter)}</code></pre>'
+        '</div>'
+    )
+
+
+def render_content(content):
+    """Sanitize a post body and pre-render its code blocks"""
+    cleaned = bleach.clean(
+        content or '',
+        tags=ALLOWED_TAGS,
+        attributes=ALLOWED_ATTRIBUTES,
+        protocols=ALLOWED_PROTOCOLS,
+        css_sanitizer=css_sanitizer,
+        strip=True,
+    )
+    return CODE_BLOCK_RE.sub(render_code_block, cleaned)
+
+
+def render_posts(queryset):
+    """Store rendered bodies for every post in the queryset that is out of date"""
+    stale = []
+    for post in queryset.only('pk', 'content', 'rendered_content_hash').iterator():
+        digest = content_hash(post.content)
+        if post.rendered_content_hash != digest:
+            post.rendered_content = render_content(post.content)
+            post.rendered_content_hash = digest
+            stale.append(post)
+    queryset.model.objects.bulk_update(stale, ['rendered_content', 'rendered_content_hash'], batch_size=100)
+    return len(stale)
@@ -0,0 +1,228 @@
+"""
+Daily coffee revenue rollups.
+
+``DailyCoffeeRevenue`` keeps one row per day, currency and payment method
+with the amount received and the number of purchases behind it. A paid
+purchase counts on the day it was paid (``created_at`` for old purchases
+with no ``paid_at``). Rows are adjusted by deltas whenever a purchase
+enters or leaves the paid state or a paid purchase is edited: from
+``main.signals`` for single saves and deletes, and from ``mark_paid`` and
+``mark_pending`` for the admin's bulk actions, which bypass signals. The
+revenue dashboard reads only the rollups.
+
+``manage.py rebuild_coffee_revenue`` recomputes every row from the purchases.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import CoffeePurchase, DailyCoffeeRevenue
+
+# Changing any of these can move a purchase's amount to another rollup row
+REVENUE_FIELDS = ('is_paid', 'paid_at', 'created_at', 'currency', 'payment_method', 'amount')
+
+
+def paid_share(is_paid, paid_at, created_at, currency, payment_method, amount):
+    """(rollup key, amount) a purchase contributes, or None when it is unpaid"""
+    if not is_paid:
+        return None
+    day = timezone.localdate(paid_at or created_at)
+    return (day, currency, payment_method), amount
+
+
+def purchase_share(purchase):
+    return paid_share(*(getattr(purchase, field) for field in REVENUE_FIELDS))
+
+
+def stored_share(purchase_id):
+    """What the purchase contributes as currently saved"""
+    row = CoffeePurchase.objects.filter(pk=purchase_id).values(*REVENUE_FIELDS).first()
+    return paid_share(**row) if row else None
+
+
+def apply_deltas(deltas):
+    """Add ``{key: [amount, purchases]}`` to the rollup rows, creating them as needed"""
+    # A fixed order keeps concurrent updates from locking rows in opposite orders
+    for key in sorted(deltas):
+        amount, purchases = deltas[key]
+        if not amount and not purchases:
+            continue
+        day, currency, payment_method = key
+        rows = DailyCoffeeRevenue.objects.filter(date=day, currency=currency, payment_method=payment_method)
+        changes = {'amount': F('amount') + amount, 'purchases': F('purchases') + purchases}
+        if rows.update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                DailyCoffeeRevenue.objects.create(
+                    date=day, currency=currency, payment_method=payment_method,
+                    amount=amount, purchases=purchases,
+                )
+        except IntegrityError:
+            # Another transaction created the row first
+            rows.update(**changes)
+
+
+def shift(before, after):
+    """Move a purchase's contribution from ``before`` to ``after`` (either may be None)"""
+    if before == after:
+        return
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    if before:
+        deltas[before[0]][0] -= before[1]
+        deltas[before[0]][1] -= 1
+    if after:
+        deltas[after[0]][0] += after[1]
+        deltas[after[0]][1] += 1
+    apply_deltas(deltas)
+
+
+def mark_paid(queryset):
+    """Bulk version of ``CoffeePurchase.mark_as_paid`` that keeps the rollups in step"""
+    with transaction.atomic():
+        becoming_paid = list(queryset.filter(is_paid=False).select_for_update().values(*REVENUE_FIELDS))
+        now = timezone.now()
+        updated = queryset.update(is_paid=True, payment_status='completed', paid_at=Coalesce('paid_at', now))
+        deltas = defaultdict(lambda: [Decimal('0'), 0])
+        for row in becoming_paid:
+            key, amount = paid_share(**dict(row, is_paid=True, paid_at=row['paid_at'] or now))
+            deltas[key][0] += amount
+            deltas[key][1] += 1
+        apply_deltas(deltas)
+    return updated
+
+
+def mark_pending(queryset):
+    with transaction.atomic():
+        becoming_unpaid = list(queryset.filter(is_paid=True).select_for_update().values(*REVENUE_FIELDS))
+        updated = queryset.update(is_paid=False, payment_status='pending')
+        deltas = defaultdict(lambda: [Decimal('0'), 0])
+        for row in becoming_unpaid:
+            key, amount = paid_share(**row)
+            deltas[key][0] -= amount
+            deltas[key][1] -= 1
+        apply_deltas(deltas)
+    return updated
+
+
+def rebuild_revenue_rollups(purchase_model=CoffeePurchase, rollup_model=DailyCoffeeRevenue):
+    """
+    Recompute every rollup row from the purchases; returns the number of rows.
+
+    Migrations pass their historical models.
+    """
+    totals = (
+        purchase_model.objects.filter(is_paid=True)
+        .annotate(day=TruncDate(Coalesce('paid_at', 'created_at')))
+        .values('day', 'currency', 'payment_method')
+        .annotate(total=Sum('amount'), count=Count('pk'))
+        .order_by()
+    )
+    with transaction.atomic():
+        rollup_model.objects.all().delete()
+        rows = rollup_model.objects.bulk_create([
+            rollup_model(
+                date=row['day'], currency=row['currency'], payment_method=row['payment_method'],
+                amount=row['total'], purchases=row['count'],
+            )
+            for row in totals
+        ])
+    return len(rows)
+
+
+# ==================== DASHBOARD ====================
+
+def bar_chart(points):
+    """``(label, value)`` pairs with bar heights as a percentage of the largest value"""
+    peak = max((value for _, value in points), default=0)
+    return [
+        {'label': label, 'value': value, 'height': round(100 * value / peak) if peak else 0}
+        for label, value in points
+    ]
+
+
+def month_starts(last, count):
+    index = last.year * 12 + last.month - 1
+    return [datetime.date((index - i) // 12, (index - i) % 12 + 1, 1) for i in reversed(range(count))]
+
+
+def dashboard_data(today=None, days=30, months=12):
+    """Everything the revenue dashboard shows, read from the rollups alone"""
+    today = today or timezone.localdate()
+    month_start = today.replace(day=1)
+    method_names = dict(CoffeePurchase.PAYMENT_METHOD)
+
+    this_month = defaultdict(list)
+    for row in (
+        DailyCoffeeRevenue.objects.filter(date__gte=month_start, date__lte=today)
+        .values('currency', 'payment_method')
+        .annotate(total=Sum('amount'), count=Sum('purchases'))
+        .filter(count__gt=0)
+        .order_by('currency', '-total')
+    ):
+        this_month[row['currency']].append(row)
+    month_totals = []
+    for currency, rows in this_month.items():
+        total = sum(row['total'] for row in rows)
+        month_totals.append({
+            'currency': currency,
+            'total': total,
+            'count': sum(row['count'] for row in rows),
+            'methods': [
+                {
+                    'name': method_names.get(row['payment_method'], row['payment_method']),
+                    'total': row['total'],
+                    'count': row['count'],
+                    'share': round(100 * row['total'] / total) if total else 0,
+                }
+                for row in rows
+            ],
+        })
+
+    first_day = today - datetime.timedelta(days=days - 1)
+    daily = defaultdict(dict)
+    for row in (
+        DailyCoffeeRevenue.objects.filter(date__gte=first_day, date__lte=today)
+        .values('date', 'currency')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    ):
+        daily[row['currency']][row['date']] = row['total']
+    day_range = [first_day + datetime.timedelta(days=i) for i in range(days)]
+
+    month_range = month_starts(month_start, months)
+    monthly = defaultdict(dict)
+    for row in (
+        DailyCoffeeRevenue.objects.filter(date__gte=month_range[0], date__lte=today)
+        .annotate(month=TruncMonth('date'))
+        .values('month', 'currency')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    ):
+        monthly[row['currency']][row['month']] = row['total']
+
+    currencies = sorted(set(daily) | set(monthly))
+    return {
+        'today': today,
+        'month_start': month_start,
+        'month_totals': month_totals,
+        'daily_charts': [
+            {
+                'currency': currency,
+                'bars': bar_chart([(day.strftime('%b %d'), daily[currency].get(day, 0)) for day in day_range]),
+            }
+            for currency in currencies
+        ],
+        'monthly_charts': [
+            {
+                'currency': currency,
+                'bars': bar_chart([(month.strftime('%b %Y'), monthly[currency].get(month, 0)) for month in month_range]),
+            }
+            for currency in currencies
+        ],
+    }
@@ -0,0 +1,91 @@
+"""
+PostgreSQL full-text search for blog posts and projects.
+
+Each searchable model stores a weighted ``search_vector`` (GIN indexed) that
+is rebuilt by ``main.signals`` whenever the row or its tags/technologies
+change. Searches then become a single index lookup ranked by relevance.
+"""
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db.models import F, Func, OuterRef, Subquery, TextField
+
+SEARCH_CONFIG = 'english'
+
+# Wrapped around matched words in headlines; turned into <mark> by the
+# ``highlight`` template filter once the surrounding text has been escaped.
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_STOP = '\x03'
+
+
+class StripTags(Func):
+    """Drop HTML tags from a column so they are neither indexed nor shown in snippets"""
+    function = 'regexp_replace'
+    template = "%(function)s(%(expressions)s, '<[^>]+>', ' ', 'g')"
+    output_field = TextField()
+
+
+def related_names(model, relation):
+    """Subquery of all related object names for a row, joined by spaces"""
+    field = model._meta.get_field(relation)
+    through = field.remote_field.through
+    return Subquery(
+        through.objects.filter(**{field.m2m_field_name(): OuterRef('pk')})
+        .values(field.m2m_field_name())
+        .annotate(names=StringAgg(f'{field.m2m_reverse_field_name()}__name', ' '))
+        .values('names'),
+        output_field=TextField(),
+    )
+
+
+def post_search_vector(model):
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(related_names(model, 'tags'), weight='B', config=SEARCH_CONFIG)
+        + SearchVector('excerpt', weight='B', config=SEARCH_CONFIG)
+        + SearchVector(StripTags('content'), weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def project_search_vector(model):
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(related_names(model, 'technologies'), weight='B', config=SEARCH_CONFIG)
+        + SearchVector('short_description', weight='B', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_post_search_vectors(queryset):
+    """Rebuild the stored search vector for every post in the queryset"""
+    return queryset.update(search_vector=post_search_vector(queryset.model))
+
+
+def update_project_search_vectors(queryset):
+    """Rebuild the stored search vector for every project in the queryset"""
+    return queryset.update(search_vector=project_search_vector(queryset.model))
+
+
+def _search(queryset, query_text, headline_source):
+    query = SearchQuery(query_text, search_type='websearch', config=SEARCH_CONFIG)
+    return queryset.filter(search_vector=query).annotate(
+        rank=SearchRank(F('search_vector'), query),
+        headline=SearchHeadline(
+            headline_source,
+            query,
+            config=SEARCH_CONFIG,
+            start_sel=HIGHLIGHT_START,
+            stop_sel=HIGHLIGHT_STOP,
+            max_words=35,
+            min_words=15,
+        ),
+    )
+
+
+def search_posts(queryset, query_text):
+    """Filter posts by a web-style search query, best matches first"""
+    return _search(queryset, query_text, StripTags('content')).order_by('-rank', '-published_at')
+
+
+def search_projects(queryset, query_text):
+    """Filter projects by a web-style search query, best matches first"""
+    return _search(queryset, query_text, 'description').order_by('-rank', 'display_order')
@@ -0,0 +1,367 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.utils import timezone
+
+from .cache import invalidate_card_cache, invalidate_page_cache, invalidate_site_settings
+from .counters import recount_usage
+from . import revenue
+from .images import discard_image_variants, schedule_image_variants
+from .related import RELATED_KINDS, kind_for
+from .search import update_post_search_vectors, update_project_search_vectors
+from .models import Project, BlogPost, Category, Tag, Technology, SiteSettings, CoffeePurchase
+
+# Saves that only touch these fields never change what the cached pages show
+UNCACHED_FIELDS = frozenset({'view_count'})
+
+CACHED_MODELS = (Project, BlogPost, Category, Tag, Technology, SiteSettings)
+
+CACHED_RELATIONS = (
+    Project.categories.through,
+    Project.technologies.through,
+    BlogPost.categories.through,
+    BlogPost.tags.through,
+    BlogPost.related_projects.through,
+)
+
+
+# Generations move on only after commit; bumped earlier, a request in between
+# would cache the old content under the new generation for the full timeout
+
+def content_saved(sender, instance, update_fields=None, **kwargs):
+    """Invalidate cached pages when listed content changes"""
+    if update_fields and UNCACHED_FIELDS.issuperset(update_fields):
+        return
+    transaction.on_commit(invalidate_page_cache)
+
+
+def content_deleted(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_page_cache)
+
+
+def relations_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(invalidate_page_cache)
+
+
+for model in CACHED_MODELS:
+    post_save.connect(content_saved, sender=model, dispatch_uid=f'page_cache_save_{model.__name__}')
+    post_delete.connect(content_deleted, sender=model, dispatch_uid=f'page_cache_delete_{model.__name__}')
+
+for through in CACHED_RELATIONS:
+    m2m_changed.connect(relations_changed, sender=through, dispatch_uid=f'page_cache_m2m_{through.__name__}')
+
+
+# ==================== SITE SETTINGS ====================
+
+def site_settings_changed(sender, instance, **kwargs):
+    # Before commit a concurrent request could cache the old row under the new version
+    transaction.on_commit(invalidate_site_settings)
+
+
+post_save.connect(site_settings_changed, sender=SiteSettings, dispatch_uid='site_settings_saved')
+post_delete.connect(site_settings_changed, sender=SiteSettings, dispatch_uid='site_settings_deleted')
+
+
+# ==================== SEARCH VECTORS ====================
+
+POST_SEARCH_FIELDS = frozenset({'title', 'excerpt', 'content'})
+PROJECT_SEARCH_FIELDS = frozenset({'title', 'short_description', 'description'})
+
+
+def post_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or POST_SEARCH_FIELDS.intersection(update_fields):
+        update_post_search_vectors(BlogPost.objects.filter(pk=instance.pk))
+
+
+def project_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or PROJECT_SEARCH_FIELDS.intersection(update_fields):
+        update_project_search_vectors(Project.objects.filter(pk=instance.pk))
+
+
+def _relation_changed(model, update, instance, action, reverse, pk_set):
+    """Rebuild vectors for the rows on the searchable side of an M2M change"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            update(model.objects.filter(pk=instance.pk))
+    elif action == 'pre_clear':
+        # The affected rows are unknown once the relation is cleared
+        instance._search_cleared_pks = list(
+            linked_rows(model, instance).values_list('pk', flat=True)
+        )
+    elif action == 'post_clear':
+        update(model.objects.filter(pk__in=getattr(instance, '_search_cleared_pks', [])))
+    elif action in ('post_add', 'post_remove'):
+        update(model.objects.filter(pk__in=pk_set))
+
+
+def linked_rows(model, instance):
+    """Searchable rows linked to a Tag or Technology"""
+    if model is BlogPost:
+        return BlogPost.objects.filter(tags=instance)
+    return Project.objects.filter(technologies=instance)
+
+
+def post_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _relation_changed(BlogPost, update_post_search_vectors, instance, action, reverse, pk_set)
+
+
+def project_technologies_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _relation_changed(Project, update_project_search_vectors, instance, action, reverse, pk_set)
+
+
+def tag_saved(sender, instance, created, **kwargs):
+    if not created:
+        update_post_search_vectors(linked_rows(BlogPost, instance))
+
+
+def technology_saved(sender, instance, created, **kwargs):
+    if not created:
+        update_project_search_vectors(linked_rows(Project, instance))
+
+
+def tag_deleting(sender, instance, **kwargs):
+    instance._search_linked_pks = list(linked_rows(BlogPost, instance).values_list('pk', flat=True))
+
+
+def technology_deleting(sender, instance, **kwargs):
+    instance._search_linked_pks = list(linked_rows(Project, instance).values_list('pk', flat=True))
+
+
+def tag_deleted(sender, instance, **kwargs):
+    update_post_search_vectors(BlogPost.objects.filter(pk__in=getattr(instance, '_search_linked_pks', [])))
+
+
+def technology_deleted(sender, instance, **kwargs):
+    update_project_search_vectors(Project.objects.filter(pk__in=getattr(instance, '_search_linked_pks', [])))
+
+
+post_save.connect(post_saved, sender=BlogPost, dispatch_uid='search_post_saved')
+post_save.connect(project_saved, sender=Project, dispatch_uid='search_project_saved')
+post_save.connect(tag_saved, sender=Tag, dispatch_uid='search_tag_saved')
+post_save.connect(technology_saved, sender=Technology, dispatch_uid='search_technology_saved')
+pre_delete.connect(tag_deleting, sender=Tag, dispatch_uid='search_tag_deleting')
+pre_delete.connect(technology_deleting, sender=Technology, dispatch_uid='search_technology_deleting')
+post_delete.connect(tag_deleted, sender=Tag, dispatch_uid='search_tag_deleted')
+post_delete.connect(technology_deleted, sender=Technology, dispatch_uid='search_technology_deleted')
+m2m_changed.connect(post_tags_changed, sender=BlogPost.tags.through, dispatch_uid='search_post_tags')
+m2m_changed.connect(project_technologies_changed, sender=Project.technologies.through, dispatch_uid='search_project_technologies')
+
+
+# ==================== RELATED ITEMS ====================
+
+RELATED_RELATIONS = {
+    Project.categories.through: ('project', 'categories'),
+    Project.technologies.through: ('project', 'technologies'),
+    BlogPost.categories.through: ('post', 'categories'),
+    BlogPost.tags.through: ('post', 'tags'),
+}
+
+RELATED_VISIBILITY_FIELDS = frozenset({'status', 'published'})
+
+
+def schedule_related_rebuild(kind, source_ids):
+    """Rebuild related items once the current transaction has committed"""
+    from .tasks import rebuild_related_items
+
+    source_ids = sorted(source_ids)
+    if source_ids:
+        transaction.on_commit(lambda: rebuild_related_items.delay(kind, source_ids))
+
+
+def linked_items(kind, relation, instance):
+    """Ids of the projects or posts attached to a category, tag or technology"""
+    model = RELATED_KINDS[kind]['model']
+    return list(model.objects.filter(**{relation: instance}).values_list('pk', flat=True))
+
+
+def related_relation_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    kind, relation = RELATED_RELATIONS[sender]
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            schedule_related_rebuild(kind, [instance.pk])
+    elif action == 'pre_clear':
+        instance._related_cleared_pks = linked_items(kind, relation, instance)
+    elif action == 'post_clear':
+        schedule_related_rebuild(kind, getattr(instance, '_related_cleared_pks', []))
+    elif action in ('post_add', 'post_remove'):
+        schedule_related_rebuild(kind, pk_set)
+
+
+def related_item_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or RELATED_VISIBILITY_FIELDS.intersection(update_fields):
+        schedule_related_rebuild(kind_for(instance), [instance.pk])
+
+
+def related_item_deleted(sender, instance, **kwargs):
+    schedule_related_rebuild(kind_for(instance), [instance.pk])
+
+
+def relation_target_deleting(sender, instance, **kwargs):
+    """Rebuild the items that lose a category, tag or technology on delete"""
+    for kind, relation in RELATED_RELATIONS.values():
+        if sender is RELATED_KINDS[kind]['model']._meta.get_field(relation).related_model:
+            schedule_related_rebuild(kind, linked_items(kind, relation, instance))
+
+
+for through in RELATED_RELATIONS:
+    m2m_changed.connect(related_relation_changed, sender=through, dispatch_uid=f'related_m2m_{through.__name__}')
+
+for model in (Project, BlogPost):
+    post_save.connect(related_item_saved, sender=model, dispatch_uid=f'related_save_{model.__name__}')
+    post_delete.connect(related_item_deleted, sender=model, dispatch_uid=f'related_delete_{model.__name__}')
+
+for model in (Category, Tag, Technology):
+    pre_delete.connect(relation_target_deleting, sender=model, dispatch_uid=f'related_target_delete_{model.__name__}')
+
+
+# ==================== USAGE COUNTERS ====================
+
+COUNTED_RELATIONS = {
+    Project.categories.through: 'categories',
+    Project.technologies.through: 'technologies',
+    BlogPost.categories.through: 'categories',
+    BlogPost.tags.through: 'tags',
+}
+
+COUNTED_ITEMS = {
+    Project: ('categories', 'technologies'),
+    BlogPost: ('categories', 'tags'),
+}
+
+COUNTED_VISIBILITY_FIELDS = frozenset({'status', 'published'})
+
+
+def usage_relation_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if reverse:
+        # Items were attached to or detached from one category, tag or technology
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            recount_usage(type(instance).objects.filter(pk=instance.pk))
+        return
+
+    relation = COUNTED_RELATIONS[sender]
+    if action == 'pre_clear':
+        instance._usage_cleared_pks = getattr(instance, '_usage_cleared_pks', {})
+        instance._usage_cleared_pks[relation] = list(
+            getattr(instance, relation).values_list('pk', flat=True)
+        )
+    elif action == 'post_clear':
+        cleared = getattr(instance, '_usage_cleared_pks', {}).pop(relation, [])
+        recount_usage(model.objects.filter(pk__in=cleared))
+    elif action in ('post_add', 'post_remove'):
+        recount_usage(model.objects.filter(pk__in=pk_set))
+
+
+def usage_item_saved(sender, instance, created, update_fields=None, **kwargs):
+    """A project or post may have been published or hidden"""
+    if created:
+        return
+    if update_fields is None or COUNTED_VISIBILITY_FIELDS.intersection(update_fields):
+        for relation in COUNTED_ITEMS[sender]:
+            recount_usage(getattr(instance, relation).all())
+
+
+def usage_item_deleting(sender, instance, **kwargs):
+    instance._usage_linked = [
+        (getattr(instance, relation).model, list(getattr(instance, relation).values_list('pk', flat=True)))
+        for relation in COUNTED_ITEMS[sender]
+    ]
+
+
+def usage_item_deleted(sender, instance, **kwargs):
+    for model, pks in getattr(instance, '_usage_linked', []):
+        recount_usage(model.objects.filter(pk__in=pks))
+
+
+for through in COUNTED_RELATIONS:
+    m2m_changed.connect(usage_relation_changed, sender=through, dispatch_uid=f'usage_m2m_{through.__name__}')
+
+for model in COUNTED_ITEMS:
+    post_save.connect(usage_item_saved, sender=model, dispatch_uid=f'usage_save_{model.__name__}')
+    pre_delete.connect(usage_item_deleting, sender=model, dispatch_uid=f'usage_deleting_{model.__name__}')
+    post_delete.connect(usage_item_deleted, sender=model, dispatch_uid=f'usage_deleted_{model.__name__}')
+
+
+# ==================== CARD FRAGMENTS ====================
+
+CARD_RELATIONS = (
+    Project.categories.through,
+    Project.technologies.through,
+    BlogPost.categories.through,
+    BlogPost.tags.through,
+)
+
+# Objects whose names appear on many cards
+CARD_SHARED_MODELS = (Category, Tag, Technology, User)
+
+
+def card_relation_changed(sender, instance, action, reverse, **kwargs):
+    """Give the project or post a new updated_at so its cards are re-rendered"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        invalidate_card_cache()
+    else:
+        instance.updated_at = timezone.now()
+        type(instance).objects.filter(pk=instance.pk).update(updated_at=instance.updated_at)
+
+
+def card_shared_object_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Logins only touch last_login, which no card shows
+    if created or (update_fields and set(update_fields) == {'last_login'}):
+        return
+    invalidate_card_cache()
+
+
+def card_shared_object_deleted(sender, instance, **kwargs):
+    invalidate_card_cache()
+
+
+for through in CARD_RELATIONS:
+    m2m_changed.connect(card_relation_changed, sender=through, dispatch_uid=f'card_m2m_{through.__name__}')
+
+for model in CARD_SHARED_MODELS:
+    post_save.connect(card_shared_object_saved, sender=model, dispatch_uid=f'card_shared_save_{model.__name__}')
+    post_delete.connect(card_shared_object_deleted, sender=model, dispatch_uid=f'card_shared_delete_{model.__name__}')
+
+
+# ==================== IMAGE VARIANTS ====================
+
+def image_item_saved(sender, instance, **kwargs):
+    # Variants of a replaced image are deleted when the new ones are built
+    schedule_image_variants(instance)
+
+
+def image_item_deleted(sender, instance, **kwargs):
+    discard_image_variants(instance)
+
+
+for model in (Project, BlogPost):
+    post_save.connect(image_item_saved, sender=model, dispatch_uid=f'image_variants_save_{model.__name__}')
+    post_delete.connect(image_item_deleted, sender=model, dispatch_uid=f'image_variants_delete_{model.__name__}')
+
+
+# ==================== REVENUE ROLLUPS ====================
+
+def purchase_saving(sender, instance, update_fields=None, **kwargs):
+    """Remember what the purchase contributed to the rollups before this save"""
+    if instance._state.adding:
+        instance._revenue_before = None
+    elif update_fields and not set(revenue.REVENUE_FIELDS).intersection(update_fields):
+        # None of the saved fields can move revenue
+        instance._revenue_before = revenue.purchase_share(instance)
+    else:
+        instance._revenue_before = revenue.stored_share(instance.pk)
+
+
+def purchase_saved(sender, instance, **kwargs):
+    revenue.shift(instance._revenue_before, revenue.purchase_share(instance))
+
+
+def purchase_deleted(sender, instance, **kwargs):
+    revenue.shift(revenue.purchase_share(instance), None)
+
+
+pre_save.connect(purchase_saving, sender=CoffeePurchase, dispatch_uid='revenue_purchase_saving')
+post_save.connect(purchase_saved, sender=CoffeePurchase, dispatch_uid='revenue_purchase_saved')
+post_delete.connect(purchase_deleted, sender=CoffeePurchase, dispatch_uid='revenue_purchase_deleted')
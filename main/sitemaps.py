@@ -0,0 +1,129 @@
+"""
+XML sitemaps for crawlers.
+
+``/sitemap.xml`` is an index of one sitemap per content type. Each section
+is written straight from an ``only()`` queryset read with ``iterator()``,
+so even a large section is streamed row by row instead of being built as
+model instances and a template context first. Both are kept in the page
+cache until content changes (see ``cache_until_content_changes``).
+"""
+import math
+from xml.sax.saxutils import escape
+
+from django.contrib.sitemaps import Sitemap
+from django.db.models import Exists, OuterRef
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import cache_until_content_changes
+from .models import BlogPost, Category, Project, Tag
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def published_posts():
+    return BlogPost.objects.filter(published=True, status='published', published_at__lte=timezone.now())
+
+
+class BlogPostSitemap(Sitemap):
+    changefreq = 'weekly'
+    priority = 0.8
+
+    def items(self):
+        return published_posts().only('slug', 'updated_at').order_by('-published_at', '-id')
+
+    def lastmod(self, post):
+        return post.updated_at
+
+
+class ProjectSitemap(Sitemap):
+    changefreq = 'monthly'
+    priority = 0.7
+
+    def items(self):
+        return Project.objects.filter(status='completed').only('slug', 'updated_at').order_by('display_order', '-id')
+
+    def lastmod(self, project):
+        return project.updated_at
+
+
+class CategorySitemap(Sitemap):
+    """Categories with at least one published post; the others have empty pages"""
+    changefreq = 'weekly'
+    priority = 0.4
+
+    def items(self):
+        posts = published_posts().filter(categories=OuterRef('pk'))
+        return Category.objects.filter(Exists(posts)).only('slug', 'updated_at').order_by('id')
+
+    def lastmod(self, category):
+        return category.updated_at
+
+
+class TagSitemap(Sitemap):
+    changefreq = 'weekly'
+    priority = 0.3
+
+    def items(self):
+        posts = published_posts().filter(tags=OuterRef('pk'))
+        return Tag.objects.filter(Exists(posts)).only('slug', 'updated_at').order_by('id')
+
+    def lastmod(self, tag):
+        return tag.updated_at
+
+
+SITEMAPS = {
+    'posts': BlogPostSitemap,
+    'projects': ProjectSitemap,
+    'categories': CategorySitemap,
+    'tags': TagSitemap,
+}
+
+
+def url_entry(request, sitemap, item):
+    parts = [f'<loc>{escape(request.build_absolute_uri(sitemap.location(item)))}</loc>']
+    lastmod = sitemap.lastmod(item)
+    if lastmod:
+        parts.append(f'<lastmod>{lastmod.date().isoformat()}</lastmod>')
+    parts.append(f'<changefreq>{sitemap.changefreq}</changefreq>')
+    parts.append(f'<priority>{sitemap.priority}</priority>')
+    return f'<url>{"".join(parts)}</url>\n'
+
+
+@cache_until_content_changes()
+def sitemap_index(request):
+    entries = []
+    for section, sitemap_class in SITEMAPS.items():
+        sitemap = sitemap_class()
+        location = request.build_absolute_uri(reverse('sitemap_section', kwargs={'section': section}))
+        pages = max(1, math.ceil(sitemap.items().count() / sitemap.limit))
+        for page in range(1, pages + 1):
+            url = location if page == 1 else f'{location}?p={page}'
+            entries.append(f'<sitemap><loc>{escape(url)}</loc></sitemap>\n')
+    content = f'{XML_HEADER}<sitemapindex xmlns="{SITEMAP_NS}">\n{"".join(entries)}</sitemapindex>\n'
+    return HttpResponse(content, content_type='application/xml')
+
+
+@cache_until_content_changes(vary_params=('p',))
+def sitemap_section(request, section):
+    if section not in SITEMAPS:
+        raise Http404("No such sitemap.")
+    sitemap = SITEMAPS[section]()
+    try:
+        page = int(request.GET.get('p', 1))
+    except ValueError:
+        raise Http404("Invalid sitemap page.")
+    if page < 1 or (page > 1 and page > math.ceil(sitemap.items().count() / sitemap.limit)):
+        raise Http404("No such sitemap page.")
+
+    items = sitemap.items()[(page - 1) * sitemap.limit:page * sitemap.limit]
+
+    def stream():
+        yield f'{XML_HEADER}<urlset xmlns="{SITEMAP_NS}">\n'
+        for item in items.iterator(chunk_size=2000):
+            yield url_entry(request, sitemap, item)
+        yield '</urlset>\n'
+
+    return StreamingHttpResponse(stream(), content_type='application/xml')
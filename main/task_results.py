@@ -0,0 +1,32 @@
+"""
+Expiry of stored Celery results.
+
+Most tasks ignore their results (``CELERY_TASK_IGNORE_RESULT``), but the
+ones that keep them, and the failures that are always stored, still pile
+up in ``django_celery_results``. Old rows are deleted here in small batches
+so the hourly sweep never holds long locks or builds one huge transaction.
+"""
+from django.conf import settings
+from django.utils import timezone
+from django_celery_results.models import GroupResult, TaskResult
+
+EXPIRY_BATCH_SIZE = 5000
+
+
+def delete_in_batches(queryset, batch_size):
+    deleted = 0
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += queryset.model.objects.filter(pk__in=ids).delete()[0]
+
+
+def expire_task_results(expires=None, batch_size=EXPIRY_BATCH_SIZE):
+    """Delete task and group results finished longer than ``expires`` ago"""
+    expires = expires or settings.TASK_RESULT_EXPIRES
+    cutoff = timezone.now() - expires
+    return {
+        'tasks': delete_in_batches(TaskResult.objects.filter(date_done__lt=cutoff), batch_size),
+        'groups': delete_in_batches(GroupResult.objects.filter(date_done__lt=cutoff), batch_size),
+    }
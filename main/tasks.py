@@ -0,0 +1,98 @@
+from celery import Task, shared_task
+from django.apps import apps
+import logging
+
+from . import analytics, counters, images, mailing, payments, related, task_results
+from .models import CoffeePurchase
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name='flush_view_counts')
+def flush_view_counts():
+    flushed = counters.flush_view_counts()
+    if flushed:
+        logger.info(f"Flushed {flushed} blog post views")
+    return flushed
+
+
+@shared_task(name='rebuild_related_items')
+def rebuild_related_items(kind, source_ids=None):
+    related.rebuild_related_items(kind, source_ids)
+
+
+class CoffeePaymentTask(Task):
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        # Retries ran out (or the charge failed outright): report it to the pending page
+        payments.fail_payment(args[0])
+        logger.error(f"Payment for purchase {args[0]} failed: {exc}")
+
+
+# The outcome of a charge is kept as an audit trail next to the purchase
+@shared_task(
+    base=CoffeePaymentTask,
+    name='process_coffee_payment',
+    ignore_result=False,
+    autoretry_for=(payments.PaymentGatewayError,),
+    retry_backoff=True,
+    max_retries=5,
+)
+def process_coffee_payment(purchase_id):
+    purchase = CoffeePurchase.objects.get(pk=purchase_id)
+    if purchase.is_paid:
+        return purchase.payment_status
+    result = payments.get_gateway().charge(purchase)
+    return payments.finalize_payment(purchase.reference, result).payment_status
+
+
+@shared_task(name='generate_image_variants')
+def generate_image_variants(model_label, pk):
+    model = apps.get_model(model_label)
+    variants = images.refresh_image_variants(model, pk)
+    return {field: entry['source'] for field, entry in variants.items()}
+
+
+# Keeps the name of the placeholder it replaces so existing schedules still apply
+@shared_task(name='send_newsletter')
+def send_newsletters():
+    started = 0
+    for submission_id in mailing.due_submissions().values_list('pk', flat=True):
+        if mailing.start_delivery(submission_id):
+            started += 1
+    return started
+
+
+@shared_task(bind=True, name='send_newsletter_chunk', max_retries=mailing.NEWSLETTER_MAX_RETRIES)
+def send_newsletter_chunk(self, delivery_id, subscription_ids):
+    failed = mailing.send_chunk(delivery_id, subscription_ids)
+    if failed and self.request.retries < self.max_retries:
+        # Only the recipients that failed are tried again
+        raise self.retry(
+            args=(delivery_id, failed),
+            countdown=mailing.NEWSLETTER_RETRY_BACKOFF * 2 ** self.request.retries,
+        )
+    if failed:
+        mailing.record_failures(delivery_id, failed)
+    mailing.finish_if_complete(delivery_id)
+    return len(subscription_ids) - len(failed)
+
+
+@shared_task(name='expire_task_results')
+def expire_task_results():
+    deleted = task_results.expire_task_results()
+    if any(deleted.values()):
+        logger.info(f"Expired {deleted['tasks']} task and {deleted['groups']} group results")
+    return deleted
+
+
+@shared_task(name='ingest_page_views')
+def ingest_page_views():
+    ingested = analytics.ingest_page_views()
+    if ingested:
+        logger.info(f"Stored {ingested} page views")
+    return ingested
+
+
+@shared_task(name='create_page_view_partitions')
+def create_page_view_partitions():
+    return analytics.create_page_view_partitions()
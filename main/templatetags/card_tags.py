@@ -0,0 +1,47 @@
+from django import template
+from django.core.cache import cache
+
+from main.cache import CARD_CACHE_TIMEOUT, card_cache_key, get_card_cache_version
+
+register = template.Library()
+
+
+class CardCacheNode(template.Node):
+    def __init__(self, nodelist, obj, name):
+        self.nodelist = nodelist
+        self.obj = obj
+        self.name = name
+
+    def render(self, context):
+        obj = self.obj.resolve(context)
+        # Search results carry a per-query headline and are rendered fresh
+        if getattr(obj, 'headline', None):
+            return self.nodelist.render(context)
+
+        if 'card_cache_version' not in context.render_context:
+            context.render_context['card_cache_version'] = get_card_cache_version()
+        key = card_cache_key(self.name.resolve(context), obj, context.render_context['card_cache_version'])
+
+        content = cache.get(key)
+        if content is None:
+            content = self.nodelist.render(context)
+            cache.set(key, content, CARD_CACHE_TIMEOUT)
+        return content
+
+
+@register.tag
+def cardcache(parser, token):
+    """
+    Cache the enclosed card markup for one object::
+
+        {% cardcache project 'project_card' %} ... {% endcardcache %}
+
+    The fragment is shared by every page that shows the object, whatever
+    filters or page the surrounding listing was rendered with.
+    """
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes an object and a card name")
+    nodelist = parser.parse(('endcardcache',))
+    parser.delete_first_token()
+    return CardCacheNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
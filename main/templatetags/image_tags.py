@@ -0,0 +1,46 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+# A card spans a third of the grid on large screens and half on tablets
+CARD_SIZES = '(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw'
+
+
+@register.simple_tag
+def responsive_image(obj, field, sizes=CARD_SIZES, **attrs):
+    """
+    Render an image field as a <picture> with AVIF/WebP ``srcset`` variants::
+
+        {% responsive_image post 'featured_image' alt=post.title class="w-full h-48" loading="lazy" %}
+
+    Until the variants have been generated (see ``main.images``) this falls
+    back to a plain <img> of the original upload.
+    """
+    image = getattr(obj, field)
+    if not image:
+        return ''
+
+    entry = (obj.image_variants or {}).get(field)
+    if entry and entry['source'] != image.name:
+        entry = None
+
+    img_attrs = {'src': image.url, 'decoding': 'async', **attrs}
+    if entry:
+        img_attrs.update(width=entry['width'], height=entry['height'])
+    img = format_html('<img{}>', flatatt(img_attrs))
+    if not entry:
+        return img
+
+    sources = format_html_join(
+        '',
+        '<source type="image/{}" srcset="{}" sizes="{}">',
+        (
+            (fmt, ', '.join(f'{default_storage.url(name)} {width}w' for width, name in files), sizes)
+            for fmt, files in entry['variants'].items()
+            if files
+        ),
+    )
+    return format_html('<picture style="display: contents">{}{}</picture>', sources, img)
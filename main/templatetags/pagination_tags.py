@@ -0,0 +1,34 @@
+from django import template
+
+register = template.Library()
+
+
+def filter_params(context):
+    """The current request's filters, limited to the ones the view accepts"""
+    view = context.get('view')
+    allowed = set(getattr(view, 'cache_vary_params', ())) - {'page', 'cursor'}
+    params = context['request'].GET.copy()
+    for key in list(params):
+        if key not in allowed:
+            del params[key]
+    return params
+
+
+@register.simple_tag(takes_context=True)
+def page_url(context, page, direction):
+    """
+    Query string for the page before or after ``page``, or for page number
+    ``direction``, keeping the filters the view accepts.
+
+    Works for both cursor pages (``?cursor=``) and numbered pages (``?page=``).
+    """
+    params = filter_params(context)
+    if hasattr(page, 'next_cursor'):
+        params['cursor'] = page.next_cursor if direction == 'next' else page.previous_cursor
+    elif direction == 'next':
+        params['page'] = page.next_page_number()
+    elif direction == 'previous':
+        params['page'] = page.previous_page_number()
+    else:
+        params['page'] = direction
+    return f'?{params.urlencode()}'
@@ -0,0 +1,33 @@
+"""
+Counts and existence checks for related managers that reuse prefetched rows.
+
+``{{ project.technologies|related_count }}`` and ``{% if post.tags|has_related %}``
+answer from the ``prefetch_related`` cache when the view filled it and only
+fall back to a COUNT/EXISTS query when it did not.
+"""
+from django import template
+
+register = template.Library()
+
+
+def prefetched_rows(manager):
+    """The prefetched rows behind a related manager, or None if not prefetched"""
+    cache_name = getattr(manager, 'prefetch_cache_name', None)
+    if cache_name is None:
+        cache_name = manager.field.remote_field.cache_name
+    prefetched = getattr(manager.instance, '_prefetched_objects_cache', {})
+    if cache_name in prefetched:
+        return prefetched[cache_name]
+    return None
+
+
+@register.filter
+def related_count(manager):
+    rows = prefetched_rows(manager)
+    return len(rows) if rows is not None else manager.count()
+
+
+@register.filter
+def has_related(manager):
+    rows = prefetched_rows(manager)
+    return bool(rows) if rows is not None else manager.exists()
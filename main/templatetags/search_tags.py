@@ -0,0 +1,18 @@
+import html
+
+from django import template
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from main.search import HIGHLIGHT_START, HIGHLIGHT_STOP
+
+register = template.Library()
+
+
+@register.filter
+def highlight(headline):
+    """Escape a search headline and wrap the matched words in <mark>"""
+    text = escape(html.unescape(headline))
+    return mark_safe(
+        text.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_STOP, '</mark>')
+    )
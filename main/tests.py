@@ -1,3 +1,1313 @@
-from django.test import TestCase
+import io
+import json
+import re
+import shutil
+import smtplib
+import tempfile
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import redis
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.contrib.sites.models import Site
+from django.core import mail
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import EmailMessage, get_connection
+from django.core.management import call_command
+from django.templatetags.static import static
+from django.db import DatabaseError, connection, connections
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from django_celery_results.models import TaskResult
+from newsletter.models import Message, Newsletter, Submission, Subscription
+from PIL import Image
+from portfolio.celery import celery_app
+
+from . import analytics, counters, mailing, revenue
+from .analysis import analyze_content
+from .cache import get_site_settings
+from .models import (
+    Category, Technology, Project, BlogPost, Tag, CoffeePurchase, DailyCoffeeRevenue, NewsletterDelivery, PageView, RelatedItem, SiteSettings
+)
+from .middleware import QueryPatternMiddleware
+from .pagination import CursorPaginator
+from .payments import FakeGateway, PaymentGatewayError, sign_payload
+from .related import get_related, rebuild_related_items
+from .rendering import render_content
+from .search import HIGHLIGHT_START, HIGHLIGHT_STOP, search_posts, search_projects
+from .task_results import expire_task_results
+from .tasks import generate_image_variants, process_coffee_payment, send_newsletter_chunk, send_newsletters
+from .views import AsyncHomeView, BlogListView, load_concurrently
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Generous enough for a slow CI machine, tight enough to catch a runaway page
+MAX_RESPONSE_SECONDS = 1.0
+
+
+def seed_portfolio():
+    """Create a realistically sized portfolio: enough rows to paginate and relate"""
+    author = User.objects.create_user('author', 'author@example.com', 'password', first_name='Ada', last_name='Writer')
+    SiteSettings.objects.create(site_name="Test Portfolio", github_url='https://github.com/test')
+
+    categories = [Category.objects.create(name=f"Category {i}") for i in range(4)]
+    technologies = [Technology.objects.create(name=f"Technology {i}", icon='fab fa-python') for i in range(6)]
+    tags = [Tag.objects.create(name=f"tag-{i}") for i in range(8)]
+
+    projects = []
+    for i in range(12):
+        project = Project.objects.create(
+            title=f"Project {i}",
+            description=f"A detailed description of project {i}. " * 20,
+            short_description=f"Project {i} in a sentence.",
+            featured=i < 4,
+            display_order=i,
+            github_url='https://github.com/test/project',
+        )
+        project.categories.set(categories[i % 4:i % 4 + 2])
+        project.technologies.set(technologies[i % 6:i % 6 + 3])
+        projects.append(project)
+
+    posts = []
+    for i in range(15):
+        post = BlogPost.objects.create(
+            title=f"Blog post {i}",
+            content="<p>Paragraph of content with <code>code</code>.</p>" * 50,
+            excerpt=f"Excerpt for post {i}",
+            author=author,
+            published=True,
+            status='published',
+            featured=i == 0,
+        )
+        post.categories.set(categories[i % 4:i % 4 + 2])
+        post.tags.set(tags[i % 8:i % 8 + 3])
+        post.related_projects.set(projects[i % 12:i % 12 + 2])
+        posts.append(post)
+
+    for i in range(5):
+        CoffeePurchase.objects.create(
+            name=f"Supporter {i}", amount=Decimal('5.00'), is_paid=True,
+            message="Keep it up!", public_message=True,
+        )
+
+    rebuild_related_items('project')
+    rebuild_related_items('post')
+    return {
+        'categories': categories, 'technologies': technologies, 'tags': tags,
+        'projects': projects, 'posts': posts,
+    }
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RouteBudgetTests(TestCase):
+    """Every public route must stay within its query and response time budget"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_portfolio()
+
+    def setUp(self):
+        cache.clear()
+        # Keep the buffered view counter out of the budgets; it lives in Redis
+        patcher = mock.patch('main.counters.get_redis')
+        self.redis = patcher.start()
+        self.redis.return_value.hincrby.return_value = 1
+        self.redis.return_value.hmget.side_effect = lambda key, ids: [None] * len(ids)
+        self.addCleanup(patcher.stop)
+
+    def assertWithinBudget(self, url, max_queries, status_code=200):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = self.client.get(url)
+            elapsed = time.perf_counter() - started
+        self.assertEqual(response.status_code, status_code)
+        self.assertLessEqual(
+            len(queries), max_queries,
+            f"{url} ran {len(queries)} queries (budget {max_queries}):\n"
+            + "\n".join(query['sql'] for query in queries.captured_queries)
+        )
+        self.assertLess(elapsed, MAX_RESPONSE_SECONDS, f"{url} took {elapsed:.3f}s")
+        return response
+
+    def test_home(self):
+        self.assertWithinBudget(reverse('home'), 8)
+
+    def test_project_list(self):
+        self.assertWithinBudget(reverse('project_list'), 6)
+
+    def test_project_list_filtered(self):
+        category = self.data['categories'][0]
+        self.assertWithinBudget(f"{reverse('project_list')}?category={category.slug}&q=project", 7)
+
+    def test_project_detail(self):
+        self.assertWithinBudget(self.data['projects'][0].get_absolute_url(), 6)
+
+    def test_blog_list(self):
+        self.assertWithinBudget(reverse('blog_list'), 6)
+
+    def test_blog_list_filtered(self):
+        tag = self.data['tags'][0]
+        self.assertWithinBudget(f"{reverse('blog_list')}?tag={tag.slug}&page=1", 7)
+
+    def test_blog_detail(self):
+        self.assertWithinBudget(self.data['posts'][0].get_absolute_url(), 7)
+
+    def test_buy_coffee(self):
+        self.assertWithinBudget(reverse('buy_coffee'), 2)
+
+    def test_coffee_thankyou(self):
+        self.assertWithinBudget(reverse('coffee_thankyou'), 2)
+
+    def test_category_posts(self):
+        self.assertWithinBudget(reverse('category_posts', args=[self.data['categories'][0].slug]), 3)
+
+    def test_tag_posts(self):
+        self.assertWithinBudget(reverse('tag_posts', args=[self.data['tags'][0].slug]), 3)
+
+    def test_contact(self):
+        response = self.assertWithinBudget(reverse('contact'), 0, status_code=302)
+        self.assertEqual(response['Location'], reverse('home') + '#contact')
+
+    def test_cached_pages_skip_the_database(self):
+        for url in (reverse('home'), reverse('project_list'), reverse('blog_list')):
+            self.client.get(url)
+            response = self.assertWithinBudget(url, 0)
+            self.assertEqual(response['X-Page-Cache'], 'HIT')
+
+    @override_settings(ALLOWED_HOSTS=['good.example', 'evil.example'])
+    def test_host_and_unknown_params_cannot_poison_the_cache(self):
+        url = reverse('blog_list')
+        poisoned = self.client.get(f'{url}?utm_source=EVILPARAM', HTTP_HOST='evil.example')
+        self.assertNotIn('X-Page-Cache', poisoned)
+
+        self.client.get(url, HTTP_HOST='evil.example')
+        response = self.client.get(url, HTTP_HOST='good.example')
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertNotContains(response, 'evil.example')
+        self.assertNotContains(response, 'EVILPARAM')
+
+    def test_detail_views_fetch_object_once(self):
+        for obj, table in ((self.data['projects'][0], 'main_project'), (self.data['posts'][0], 'main_blogpost')):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(obj.get_absolute_url())
+            lookups = [
+                query['sql'] for query in queries.captured_queries
+                if query['sql'].startswith(f'SELECT "{table}"."id"') and '"slug" =' in query['sql']
+            ]
+            self.assertEqual(len(lookups), 1, lookups)
+
+    def test_deep_cursor_page(self):
+        first = self.client.get(reverse('blog_list'))
+        next_url = f"{reverse('blog_list')}?cursor={first.context['page_obj'].next_cursor}"
+        with CaptureQueriesContext(connection) as queries:
+            self.assertWithinBudget(next_url, 6)
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'])
+            self.assertNotIn('OFFSET', query['sql'])
+
+        # The page starts from an index seek at the cursor, not a scan of every earlier row
+        page_sql = next(
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "main_blogpost"' in query['sql'] and 'LIMIT' in query['sql']
+        )
+        with connection.cursor() as cursor:
+            # The handful of test rows would otherwise be sorted in memory
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_sort = off")
+            cursor.execute(f"EXPLAIN ANALYZE {page_sql}")
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('Index Scan using main_blogpost_keyset_idx', plan)
+        # At most the cursor row itself is read and thrown away, never the first page
+        removed = re.search(r'Rows Removed by Filter: (\d+)', plan)
+        self.assertLessEqual(int(removed.group(1)) if removed else 0, 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Full-text search needs PostgreSQL")
+class SearchTests(TestCase):
+    """Stored search vectors follow edits, and matches are ranked by field weight"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author')
+        cls.title_match = BlogPost.objects.create(
+            title="Tuning PostgreSQL indexes", content="<p>Notes on storage.</p>", author=author,
+        )
+        cls.body_match = BlogPost.objects.create(
+            title="Weekend notes", content="<p>Some words about <b>postgresql</b> replication.</p>", author=author,
+        )
+
+    def test_title_matches_rank_above_body_matches(self):
+        results = list(search_posts(BlogPost.objects.all(), 'postgresql'))
+        self.assertEqual(results, [self.title_match, self.body_match])
+        self.assertIn(f'{HIGHLIGHT_START}postgresql{HIGHLIGHT_STOP}', results[1].headline)
+        self.assertNotIn('<b>', results[1].headline)
+
+    def test_websearch_syntax(self):
+        self.assertEqual(list(search_posts(BlogPost.objects.all(), 'postgresql -replication')), [self.title_match])
+        self.assertEqual(list(search_posts(BlogPost.objects.all(), '"postgresql replication"')), [self.body_match])
+
+    def test_vectors_refresh_on_save_and_relation_changes(self):
+        self.assertFalse(search_posts(BlogPost.objects.all(), 'sharding').exists())
+        self.body_match.title = "Sharding at home"
+        self.body_match.save()
+        self.assertEqual(list(search_posts(BlogPost.objects.all(), 'sharding')), [self.body_match])
+
+        project = Project.objects.create(title="Site", description="d", short_description="s")
+        project.technologies.add(Technology.objects.create(name="Kubernetes"))
+        self.assertEqual(list(search_projects(Project.objects.all(), 'kubernetes')), [project])
+
+
+class RelatedItemTests(TestCase):
+    """Neighbours are ranked by weighted shared relations and follow changes"""
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Web")
+        self.django, self.postgres = (Technology.objects.create(name=name) for name in ("Django", "PostgreSQL"))
+        self.source, self.stack_twin, self.same_category, self.hidden, self.unrelated = (
+            Project.objects.create(title=title, description="d", short_description="s", status=status)
+            for title, status in (
+                ("Source", 'completed'), ("Stack twin", 'completed'), ("Same category", 'completed'),
+                ("Hidden", 'planned'), ("Unrelated", 'completed'),
+            )
+        )
+        self.source.categories.add(self.category)
+        self.source.technologies.add(self.django, self.postgres)
+        self.stack_twin.technologies.add(self.django, self.postgres)
+        self.same_category.categories.add(self.category)
+        self.hidden.categories.add(self.category)
+        self.hidden.technologies.add(self.django, self.postgres)
+
+    def related(self):
+        return get_related(self.source, Project.objects.all(), 5)
+
+    def test_ranking_by_weighted_shared_relations(self):
+        rebuild_related_items('project', model=Project, related_model=RelatedItem)
+        # Two shared technologies (weight 2 each) beat one shared category
+        self.assertEqual(self.related(), [self.stack_twin, self.same_category])
+
+    def test_changes_rebuild_the_affected_items(self):
+        rebuild_related_items('project')
+        with mock.patch('main.tasks.rebuild_related_items.delay', side_effect=rebuild_related_items):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.same_category.technologies.add(self.django, self.postgres)
+            self.assertEqual(self.related(), [self.same_category, self.stack_twin])
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.same_category.delete()
+            self.assertEqual(self.related(), [self.stack_twin])
+            self.assertFalse(RelatedItem.objects.filter(target_id=self.same_category.pk).exists())
+
+
+class FakeRedis:
+    """Just enough of a Redis client for the view counter"""
+
+    def __init__(self):
+        self.hashes = {}
+
+    def hincrby(self, key, field, amount=1):
+        fields = self.hashes.setdefault(key, {})
+        fields[str(field).encode()] = fields.get(str(field).encode(), 0) + amount
+        return fields[str(field).encode()]
+
+    def hmget(self, key, fields):
+        return [self.hashes.get(key, {}).get(str(field).encode()) for field in fields]
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def delete(self, key):
+        return int(self.hashes.pop(key, None) is not None)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client, self.calls = client, []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class ViewCounterTests(TestCase):
+    """Views are buffered in Redis and applied to the rows exactly once"""
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = mock.patch('main.counters.get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        author = User.objects.create_user('author')
+        self.post = BlogPost.objects.create(title="Post", content="<p>x</p>", author=author, view_count=10)
+
+    def test_views_are_buffered_and_attached(self):
+        counters.record_view(self.post.pk)
+        self.assertEqual(counters.record_view(self.post.pk), 2)
+        [post] = counters.attach_pending_views(BlogPost.objects.all())
+        self.assertEqual((post.view_count, post.pending_views), (10, 2))
+
+        with mock.patch.object(self.redis, 'hmget', side_effect=redis.RedisError("down")):
+            [post] = counters.attach_pending_views(BlogPost.objects.all())
+        self.assertFalse(hasattr(post, 'pending_views'))
+
+    def test_flush_applies_each_view_once(self):
+        for _ in range(3):
+            counters.record_view(self.post.pk)
+        self.assertEqual(counters.flush_view_counts(), 3)
+        self.assertEqual(counters.flush_view_counts(), 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 13)
+
+    def test_failed_flush_keeps_its_views_for_the_next_run(self):
+        counters.record_view(self.post.pk)
+        counters.record_view(self.post.pk)
+        with mock.patch('django.db.models.query.QuerySet.update', side_effect=DatabaseError("gone")):
+            with self.assertRaises(DatabaseError):
+                counters.flush_view_counts()
+        counters.record_view(self.post.pk)
+
+        self.assertEqual(counters.flush_view_counts(), 3)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 13)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class UsageCounterTests(TestCase):
+    """Stored usage counters must follow M2M, visibility and delete changes"""
+
+    def setUp(self):
+        self.author = User.objects.create_user('author')
+        self.category = Category.objects.create(name="Django")
+        self.tag = Tag.objects.create(name="orm")
+        self.technology = Technology.objects.create(name="PostgreSQL")
+        self.project = Project.objects.create(title="Site", description="d", short_description="s")
+        self.post = BlogPost.objects.create(
+            title="Post", content="<p>x</p>", author=self.author, published=True, status='published'
+        )
+
+    def assertCounts(self, category_projects, category_posts, tag_posts, technology_projects):
+        for obj in (self.category, self.tag, self.technology):
+            obj.refresh_from_db()
+        self.assertEqual(
+            (self.category.project_count, self.category.post_count, self.tag.post_count, self.technology.project_count),
+            (category_projects, category_posts, tag_posts, technology_projects),
+        )
+
+    def test_relation_changes(self):
+        self.project.categories.add(self.category)
+        self.project.technologies.add(self.technology)
+        self.post.categories.add(self.category)
+        self.post.tags.add(self.tag)
+        self.assertCounts(1, 1, 1, 1)
+
+        self.category.blog_posts.remove(self.post)
+        self.project.technologies.clear()
+        self.assertCounts(1, 0, 1, 0)
+
+        self.tag.blog_posts.clear()
+        self.assertCounts(1, 0, 0, 0)
+
+    def test_only_public_items_count(self):
+        self.project.categories.add(self.category)
+        self.post.tags.add(self.tag)
+
+        self.project.status = 'planned'
+        self.project.save()
+        self.post.status = 'draft'
+        self.post.save()
+        self.assertCounts(0, 0, 0, 0)
+
+        self.post.status = 'published'
+        self.post.save()
+        self.assertCounts(0, 0, 1, 0)
+
+    def test_deleting_an_item(self):
+        self.post.categories.add(self.category)
+        self.post.tags.add(self.tag)
+        self.post.delete()
+        self.assertCounts(0, 0, 0, 0)
+
+    def test_reconcile_command_repairs_drift(self):
+        self.project.categories.add(self.category)
+        Category.objects.update(project_count=7)
+
+        out = StringIO()
+        call_command('reconcile_usage_counts', '--dry-run', stdout=out)
+        self.assertIn("1 rows have drifted", out.getvalue())
+        self.assertCounts(7, 0, 0, 0)
+
+        call_command('reconcile_usage_counts', stdout=StringIO())
+        self.assertCounts(1, 0, 0, 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PAYMENT_WEBHOOK_SECRET='test-webhook-secret')
+class CoffeePaymentTests(TestCase):
+    """Purchases are charged by the Celery task or confirmed by a signed webhook"""
+
+    def setUp(self):
+        self.purchase = CoffeePurchase.objects.create(name="Fan", amount=Decimal('5.00'), payment_method='mpesa')
+
+    def test_purchase_is_queued_not_charged(self):
+        with mock.patch('main.views.process_coffee_payment.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('buy_coffee'), {
+                    'name': "Fan", 'amount': '5.00',
+                })
+        purchase = CoffeePurchase.objects.latest('created_at')
+        self.assertRedirects(response, reverse('coffee_pending', args=[purchase.reference]))
+        self.assertFalse(purchase.is_paid)
+        delay.assert_called_once_with(purchase.pk)
+
+    def test_task_charges_through_gateway(self):
+        process_coffee_payment(self.purchase.pk)
+        self.purchase.refresh_from_db()
+        self.assertTrue(self.purchase.is_paid)
+        self.assertEqual(self.purchase.payment_status, 'completed')
+
+        response = self.client.get(reverse('coffee_status', args=[self.purchase.reference]))
+        self.assertTrue(response.json()['is_paid'])
+        self.assertEqual(response.json()['redirect'], f"{reverse('coffee_thankyou')}?ref={self.purchase.reference}")
+
+    def test_thankyou_shows_only_the_referenced_purchase(self):
+        self.purchase.mark_as_paid()
+        response = self.client.get(reverse('coffee_thankyou'))
+        self.assertIsNone(response.context['purchase'])
+        self.assertNotContains(response, "Fan,")
+        response = self.client.get(reverse('coffee_thankyou'), {'ref': 'not-a-uuid'})
+        self.assertIsNone(response.context['purchase'])
+
+        response = self.client.get(reverse('coffee_thankyou'), {'ref': str(self.purchase.reference)})
+        self.assertEqual(response.context['purchase'], self.purchase)
+        self.assertContains(response, "Fan,")
+
+    def test_exhausted_retries_fail_the_purchase(self):
+        with mock.patch.object(FakeGateway, 'charge', side_effect=PaymentGatewayError("down")) as charge:
+            result = process_coffee_payment.apply(args=[self.purchase.pk])
+        self.assertTrue(result.failed())
+        self.assertEqual(charge.call_count, process_coffee_payment.max_retries + 1)
+        self.purchase.refresh_from_db()
+        self.assertEqual(self.purchase.payment_status, 'failed')
+
+        response = self.client.get(reverse('coffee_status', args=[self.purchase.reference]))
+        self.assertEqual(response.json(), {'status': 'failed', 'is_paid': False})
+
+    def test_pending_charge_waits_for_webhook(self):
+        with mock.patch.object(FakeGateway, 'outcome', 'pending'):
+            process_coffee_payment(self.purchase.pk)
+        self.assertFalse(CoffeePurchase.objects.get(pk=self.purchase.pk).is_paid)
+
+        body = json.dumps({'reference': str(self.purchase.reference), 'status': 'completed', 'transaction_id': 'TX1'}).encode()
+        response = self.client.post(
+            reverse('coffee_webhook'), body, content_type='application/json', HTTP_X_SIGNATURE=sign_payload(body)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.purchase.refresh_from_db()
+        self.assertTrue(self.purchase.is_paid)
+        self.assertEqual(self.purchase.transaction_id, 'TX1')
+
+    def test_webhook_rejects_bad_signature(self):
+        body = json.dumps({'reference': str(self.purchase.reference), 'status': 'completed'}).encode()
+        response = self.client.post(reverse('coffee_webhook'), body, content_type='application/json', HTTP_X_SIGNATURE='bogus')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(CoffeePurchase.objects.get(pk=self.purchase.pk).is_paid)
+
+    def test_webhook_is_refused_without_a_secret(self):
+        body = json.dumps({'reference': str(self.purchase.reference), 'status': 'completed'}).encode()
+        signature = sign_payload(body)
+        with self.settings(PAYMENT_WEBHOOK_SECRET=''):
+            response = self.client.post(
+                reverse('coffee_webhook'), body, content_type='application/json', HTTP_X_SIGNATURE=signature
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(CoffeePurchase.objects.get(pk=self.purchase.pk).is_paid)
+
+
+class NewsletterDeliveryTests(TestCase):
+    """Submissions are sent in rate limited chunks over one connection each"""
+
+    def setUp(self):
+        newsletter = Newsletter.objects.create(
+            title="Updates", slug='updates', email='news@example.com', sender="Portfolio"
+        )
+        message = Message.objects.create(title="Issue 1", slug='issue-1', newsletter=newsletter)
+        self.subscriptions = [
+            Subscription.objects.create(newsletter=newsletter, email_field=f'reader{i}@example.com', subscribed=True)
+            for i in range(5)
+        ]
+        self.submission = Submission.objects.create(
+            message=message, site=Site.objects.first(), prepared=True,
+            publish_date=timezone.now() - timezone.timedelta(minutes=1),
+        )
+        self.submission.subscriptions.set(self.subscriptions)
+
+        for target, value in (('main.mailing.NEWSLETTER_CHUNK_SIZE', 2), ('main.mailing.NEWSLETTER_RETRY_BACKOFF', 0)):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('main.mailing.get_redis')
+        patcher.start().return_value.incr.return_value = 1
+        self.addCleanup(patcher.stop)
+        # Run chunk tasks in-process, retries included
+        patcher = mock.patch.object(
+            send_newsletter_chunk, 'delay', side_effect=lambda *args: send_newsletter_chunk.apply(args=args)
+        )
+        self.delay = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_submission_is_sent_in_chunks(self):
+        with mock.patch('main.mailing.get_connection', wraps=get_connection) as connections:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(send_newsletters(), 1)
+
+        self.assertEqual(self.delay.call_count, 3)
+        self.assertEqual(connections.call_count, 3)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [s.email for s in self.subscriptions])
+        delivery = NewsletterDelivery.objects.get(submission=self.submission)
+        self.assertEqual((delivery.status, delivery.sent_count, delivery.progress), ('sent', 5, 100))
+        self.submission.refresh_from_db()
+        self.assertTrue(self.submission.sent)
+        self.assertFalse(self.submission.sending)
+        # A sent submission is never picked up again
+        self.assertEqual(send_newsletters(), 0)
+
+    def test_failed_recipients_are_retried_then_recorded(self):
+        attempts = []
+        send = EmailMessage.send
+
+        def flaky_send(message, *args, **kwargs):
+            attempts.append(message.to[0])
+            if message.to[0] == 'reader1@example.com':
+                raise smtplib.SMTPRecipientsRefused({message.to[0]: (550, b'mailbox unavailable')})
+            if message.to[0] == 'reader3@example.com' and attempts.count('reader3@example.com') == 1:
+                raise smtplib.SMTPServerDisconnected("connection lost")
+            return send(message, *args, **kwargs)
+
+        with mock.patch.object(EmailMessage, 'send', flaky_send):
+            with self.captureOnCommitCallbacks(execute=True):
+                send_newsletters()
+
+        self.assertEqual(attempts.count('reader1@example.com'), 1 + mailing.NEWSLETTER_MAX_RETRIES)
+        self.assertEqual(attempts.count('reader3@example.com'), 2)
+        delivery = NewsletterDelivery.objects.get(submission=self.submission)
+        self.assertEqual((delivery.status, delivery.sent_count, delivery.failed_count), ('partial', 4, 1))
+        self.assertEqual(delivery.failed_recipients, ['reader1@example.com'])
+
+    def test_broken_message_fails_only_its_recipient(self):
+        get_message = Submission.get_message
+
+        def broken_get_message(submission, subscription):
+            if subscription.email_field == 'reader2@example.com':
+                raise UnicodeEncodeError('ascii', 'ü', 0, 1, "can't encode")
+            return get_message(submission, subscription)
+
+        # One chunk, with the broken message in the middle of it
+        with mock.patch('main.mailing.NEWSLETTER_CHUNK_SIZE', 5), \
+                mock.patch.object(Submission, 'get_message', broken_get_message):
+            with self.captureOnCommitCallbacks(execute=True):
+                send_newsletters()
+
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [
+            s.email for s in self.subscriptions if s.email != 'reader2@example.com'
+        ])
+        delivery = NewsletterDelivery.objects.get(submission=self.submission)
+        self.assertEqual((delivery.status, delivery.sent_count, delivery.failed_count), ('partial', 4, 1))
+        self.assertEqual(delivery.failed_recipients, ['reader2@example.com'])
+
+
+class TaskRoutingTests(TestCase):
+    """Latency sensitive tasks never wait behind bulk work on a shared queue"""
+
+    def test_tasks_are_routed_to_their_queues(self):
+        router = celery_app.amqp.router
+        expected = {
+            'process_coffee_payment': 'payments',
+            'send_newsletter': 'email',
+            'send_newsletter_chunk': 'email',
+            'generate_image_variants': 'media',
+            'flush_view_counts': 'default',
+        }
+        for task, queue in expected.items():
+            self.assertEqual(router.route({}, task)['queue'].name, queue, task)
+
+
+class TaskResultTests(TestCase):
+    """Only results someone reads are stored, and stored ones expire in batches"""
+
+    def test_results_are_opt_in(self):
+        self.assertTrue(celery_app.tasks['flush_view_counts'].ignore_result)
+        self.assertTrue(celery_app.tasks['send_newsletter_chunk'].ignore_result)
+        self.assertFalse(celery_app.tasks['process_coffee_payment'].ignore_result)
+
+    def test_old_results_are_deleted_in_batches(self):
+        for i in range(5):
+            TaskResult.objects.create(task_id=f'old-{i}', status='SUCCESS')
+        TaskResult.objects.create(task_id='recent', status='SUCCESS')
+        TaskResult.objects.exclude(task_id='recent').update(date_done=timezone.now() - timezone.timedelta(days=30))
+
+        with CaptureQueriesContext(connection) as queries:
+            deleted = expire_task_results(expires=timezone.timedelta(days=7), batch_size=2)
+        self.assertEqual(deleted, {'tasks': 5, 'groups': 0})
+        self.assertEqual(list(TaskResult.objects.values_list('task_id', flat=True)), ['recent'])
+        # Three batches of ids and deletes, plus the empty reads that end each sweep
+        self.assertEqual(len(queries), 8)
+
+    @override_settings(TASK_RESULT_EXPIRES=timezone.timedelta(days=7))
+    def test_only_the_batched_sweep_expires_database_results(self):
+        # With result_expires set, beat would also schedule the unbatched celery.backend_cleanup
+        self.assertIsNone(celery_app.conf.result_expires)
+        TaskResult.objects.create(task_id='old', status='SUCCESS')
+        TaskResult.objects.update(date_done=timezone.now() - timezone.timedelta(days=8))
+        self.assertEqual(expire_task_results(), {'tasks': 1, 'groups': 0})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PageViewTests(TestCase):
+    """Views are streamed to Redis in the request and stored in batches later"""
+
+    def setUp(self):
+        cache.clear()
+        SiteSettings.load()
+
+    def entry(self, entry_id, path='/blog/', device='mobile', viewed_at=None):
+        viewed_at = viewed_at or timezone.now()
+        return (entry_id.encode(), {
+            b'path': path.encode(), b'referrer': b'https://example.com/',
+            b'device': device.encode(), b'ts': str(viewed_at.timestamp()).encode(),
+        })
+
+    @mock.patch('main.analytics.get_redis')
+    def test_public_pages_are_streamed_without_queries(self, get_redis):
+        iphone = 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Mobile/15E148'
+        self.client.get(reverse('home'))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('home'), HTTP_USER_AGENT=iphone, HTTP_REFERER='https://example.com/')
+        _, fields = get_redis.return_value.xadd.call_args.args
+        self.assertEqual(fields['path'], '/')
+        self.assertEqual(fields['referrer'], 'https://example.com/')
+        self.assertEqual(fields['device'], 'mobile')
+
+        get_redis.return_value.xadd.reset_mock()
+        self.client.post(reverse('home'))
+        self.client.get('/no-such-page/')
+        self.client.get(reverse('home'), HTTP_SEC_PURPOSE='prefetch')
+        get_redis.return_value.xadd.assert_not_called()
+        self.assertFalse(analytics.is_page_view(RequestFactory().get('/admin/'), HttpResponse()))
+
+    @mock.patch('main.analytics.get_redis')
+    async def test_async_requests_are_streamed(self, get_redis):
+        async def view(request):
+            return HttpResponse('<p>Hi</p>')
+
+        middleware = analytics.PageViewMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(AsyncRequestFactory().get('/blog/'))
+        self.assertEqual(response.status_code, 200)
+        _, fields = get_redis.return_value.xadd.call_args.args
+        self.assertEqual(fields['path'], '/blog/')
+
+    def test_device_classes(self):
+        self.assertEqual(analytics.device_class('Mozilla/5.0 (Windows NT 10.0; Win64; x64) Firefox/130.0'), 'desktop')
+        self.assertEqual(analytics.device_class('Mozilla/5.0 (iPad; CPU OS 17_0 like Mac OS X)'), 'tablet')
+        self.assertEqual(analytics.device_class('Mozilla/5.0 (Linux; Android 14; SM-X200)'), 'tablet')
+        self.assertEqual(analytics.device_class('Mozilla/5.0 (Linux; Android 14; Pixel 8) Mobile Safari'), 'mobile')
+        self.assertEqual(analytics.device_class('Mozilla/5.0 (compatible; Googlebot/2.1)'), 'bot')
+        self.assertEqual(analytics.device_class(''), 'unknown')
+
+    def test_batches_land_in_monthly_partitions_once(self):
+        now = timezone.now()
+        entries = [self.entry('1-0', viewed_at=now), self.entry('2-0', path='/', device='desktop', viewed_at=now)]
+        malformed = (b'3-0', {b'path': b'/'})
+        self.assertEqual(analytics.store_page_views(entries + [malformed]), 2)
+        # A batch read again after a crash is not stored twice
+        analytics.store_page_views(entries)
+
+        self.assertEqual(PageView.objects.count(), 2)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT DISTINCT tableoid::regclass::text FROM main_pageview")
+            self.assertEqual(cursor.fetchall(), [(f'main_pageview_{now:%Y%m}',)])
+
+    @mock.patch('main.analytics.get_ingest_redis')
+    def test_ingest_acknowledges_stored_batches(self, get_redis):
+        client = get_redis.return_value
+        client.xautoclaim.return_value = [b'0-0', [], []]
+        client.xreadgroup.side_effect = [
+            [[analytics.STREAM_KEY.encode(), [self.entry('1-0'), self.entry('2-0')]]],
+            [[analytics.STREAM_KEY.encode(), [self.entry('3-0')]]],
+            [],
+        ]
+
+        self.assertEqual(analytics.ingest_page_views(batch_size=2), 3)
+        self.assertEqual(PageView.objects.count(), 3)
+        acked = client.pipeline.return_value.xack
+        self.assertEqual(acked.call_args_list[0].args[2:], (b'1-0', b'2-0'))
+        self.assertEqual(acked.call_args_list[1].args[2:], (b'3-0',))
+
+
+class RevenueRollupTests(TestCase):
+    """Daily revenue rows follow every change to paid purchases"""
+
+    def rollups(self):
+        return {
+            (row.currency, row.payment_method): (row.amount, row.purchases)
+            for row in DailyCoffeeRevenue.objects.filter(purchases__gt=0)
+        }
+
+    def assertMatchesRebuild(self):
+        incremental = self.rollups()
+        revenue.rebuild_revenue_rollups()
+        self.assertEqual(incremental, self.rollups())
+
+    def test_saves_and_deletes_adjust_rollups(self):
+        purchase = CoffeePurchase.objects.create(amount=Decimal('5.00'), payment_method='mpesa')
+        self.assertEqual(self.rollups(), {})
+
+        purchase.mark_as_paid(transaction_id='T1')
+        CoffeePurchase.objects.create(amount=Decimal('3.00'), payment_method='mpesa', is_paid=True)
+        self.assertEqual(self.rollups(), {('USD', 'mpesa'): (Decimal('8.00'), 2)})
+
+        purchase.amount = Decimal('10.00')
+        purchase.payment_method = 'card'
+        purchase.save()
+        self.assertEqual(self.rollups(), {
+            ('USD', 'mpesa'): (Decimal('3.00'), 1), ('USD', 'card'): (Decimal('10.00'), 1),
+        })
+        self.assertMatchesRebuild()
+
+        purchase.delete()
+        self.assertEqual(self.rollups(), {('USD', 'mpesa'): (Decimal('3.00'), 1)})
+
+    def test_bulk_admin_actions_adjust_rollups(self):
+        for amount, currency in (('5.00', 'USD'), ('7.00', 'USD'), ('500.00', 'KES')):
+            CoffeePurchase.objects.create(amount=Decimal(amount), currency=currency, payment_method='paypal')
+        CoffeePurchase.objects.create(amount=Decimal('2.00'), payment_method='paypal', is_paid=True)
+
+        self.assertEqual(revenue.mark_paid(CoffeePurchase.objects.all()), 4)
+        self.assertEqual(self.rollups(), {
+            ('USD', 'paypal'): (Decimal('14.00'), 3), ('KES', 'paypal'): (Decimal('500.00'), 1),
+        })
+        self.assertFalse(CoffeePurchase.objects.filter(paid_at__isnull=True).exists())
+        self.assertMatchesRebuild()
+
+        revenue.mark_pending(CoffeePurchase.objects.filter(currency='USD'))
+        self.assertEqual(self.rollups(), {('KES', 'paypal'): (Decimal('500.00'), 1)})
+        self.assertMatchesRebuild()
+
+    def test_dashboard_reads_only_rollups(self):
+        CoffeePurchase.objects.create(amount=Decimal('5.00'), payment_method='bank', is_paid=True)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:main_coffeepurchase_revenue'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['month_totals'][0]['total'], Decimal('5.00'))
+        self.assertContains(response, 'Bank Transfer')
+        self.assertFalse([q['sql'] for q in queries if 'main_coffeepurchase' in q['sql']])
+
+
+class CursorPaginationTests(TestCase):
+    """Cursor pages must cover every row exactly once, in both directions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author')
+        published_at = timezone.now() - timezone.timedelta(days=1)
+        for i in range(7):
+            # Shared timestamps make the id tie-breaker matter
+            BlogPost.objects.create(
+                title=f"Post {i}", content="<p>x</p>", author=author, published=True,
+                status='published', published_at=published_at - timezone.timedelta(hours=i // 2),
+            )
+
+    def setUp(self):
+        self.paginator = CursorPaginator(BlogPost.objects.all(), ('-published_at', '-id'), 3)
+        self.expected = list(BlogPost.objects.order_by('-published_at', '-id'))
+
+    def test_walk_forwards_and_back(self):
+        pages = [self.paginator.page()]
+        while pages[-1].has_next():
+            pages.append(self.paginator.page(pages[-1].next_cursor))
+        self.assertEqual([post for page in pages for post in page], self.expected)
+        self.assertFalse(pages[0].has_previous())
+
+        back = self.paginator.page(pages[-1].previous_cursor)
+        self.assertEqual(list(back), list(pages[-2]))
+        self.assertTrue(back.has_next())
+
+        first = self.paginator.page(pages[1].previous_cursor)
+        self.assertEqual(list(first), list(pages[0]))
+        self.assertFalse(first.has_previous())
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get(f"{reverse('blog_list')}?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_page_links_keep_only_known_filters(self):
+        author = User.objects.get(username='author')
+        with mock.patch.object(BlogListView, 'paginate_by', 3):
+            response = self.client.get(reverse('blog_list'), {'author': author.id, 'utm_source': '"><x>'})
+        page = response.context['page_obj']
+        self.assertContains(response, f'href="?author={author.id}&amp;cursor={page.next_cursor}"')
+        # A cursor page has no page numbers to link to
+        self.assertNotContains(response, 'Go to page')
+
+
+class ContentRenderingTests(TestCase):
+    """Post bodies are sanitized and highlighted once, when they change"""
+
+    def setUp(self):
+        self.post = BlogPost.objects.create(
+            title="Rendered", author=User.objects.create_user('author'), excerpt="e",
+            content='<p onclick="steal()">Hi<script>alert(1)</script></p>'
+                    '<pre class="language-python"><code>if x &lt; 1:\n    print("hi")</code></pre>',
+        )
+
+    def test_body_is_sanitized_and_highlighted(self):
+        rendered = self.post.rendered_content
+        self.assertNotIn('<script', rendered)
+        self.assertNotIn('onclick', rendered)
+        self.assertIn('<span class="language-name">PYTHON</span>', rendered)
+        self.assertIn('<span class="k">if</span>', rendered)
+        self.assertIn('&lt;', rendered)
+        self.assertEqual(rendered.count('class="copy-btn"'), 1)
+
+    def test_editor_markup_is_kept(self):
+        pixel = 'data:image/png;base64,iVBORw0KGgo='
+        rendered = render_content(
+            f'<p style="text-align: center; width: 50%;">Centered</p><img src="{pixel}" alt="pasted">'
+            '<iframe src="https://www.youtube.com/embed/abc" width="560" height="315" allowfullscreen></iframe>'
+            '<a href="/about/" class="link">About</a>'
+        )
+        self.assertIn('<p style="text-align: center; width: 50%;">Centered</p>', rendered)
+        self.assertIn(f'<img src="{pixel}" alt="pasted">', rendered)
+        self.assertIn('<iframe src="https://www.youtube.com/embed/abc" width="560" height="315" allowfullscreen="">', rendered)
+        self.assertIn('<a href="/about/" class="link">About</a>', rendered)
+
+    def test_unsafe_markup_is_dropped(self):
+        rendered = render_content(
+            '<p style="position: fixed; color: red;">Over</p>'
+            '<img src="data:image/svg+xml;base64,PHN2Zz4=" alt="svg">'
+            '<a href="data:text/html,x">Link</a>'
+            '<iframe src="https://evil.example/embed"></iframe>'
+        )
+        self.assertIn('<p style="color: red;">Over</p>', rendered)
+        self.assertIn('<img alt="svg">', rendered)
+        self.assertIn('<a>Link</a>', rendered)
+        self.assertIn('<iframe></iframe>', rendered)
+
+    def test_only_changed_content_is_rendered(self):
+        with mock.patch('main.models.render_content', return_value='<p>Rendered</p>') as render:
+            self.post.title = "Renamed"
+            self.post.save()
+            render.assert_not_called()
+
+            self.post.content = '<p>Changed</p>'
+            self.post.save(update_fields=['content'])
+            render.assert_called_once_with('<p>Changed</p>')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.rendered_content, '<p>Rendered</p>')
+
+
+class ContentAnalysisTests(TestCase):
+    """Word counts and excerpts come from the visible text, computed at save time"""
+
+    def test_analyze_content(self):
+        stats = analyze_content(
+            '<h2>Re<em>use</em> it</h2><p>one&nbsp;two</p><script>var hidden = 1;</script>' + '<p>word </p>' * 400
+        )
+        self.assertEqual(stats.word_count, 404)
+        self.assertEqual(stats.reading_time, 2)
+        self.assertTrue(stats.excerpt.startswith('Reuse it one two word word'))
+        self.assertLessEqual(len(stats.excerpt), 500)
+        self.assertTrue(stats.excerpt.endswith('…'))
+
+    def test_save_stores_derived_fields(self):
+        post = BlogPost.objects.create(
+            title="Analysed", author=User.objects.create_user('author'),
+            content='<p>' + 'lorem ipsum <a href="/x">dolor</a> ' * 100 + '</p>',
+        )
+        self.assertEqual(post.word_count, 300)
+        self.assertEqual(post.reading_time, 2)
+        self.assertNotIn('<', post.excerpt)
+        self.assertLessEqual(len(post.meta_description), 300)
+        self.assertTrue(post.excerpt.startswith(post.meta_description[:-1]))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+@override_settings(CACHES=LOCMEM_CACHES)
+class SiteSettingsCacheTests(TestCase):
+    """Cached site settings move on only once a change is committed"""
+
+    def setUp(self):
+        cache.clear()
+        self.site_settings = SiteSettings.objects.create(site_name="Before")
+
+    def test_saved_settings_replace_the_cached_copy_on_commit(self):
+        self.assertEqual(get_site_settings().site_name, "Before")
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.site_settings.site_name = "After"
+            self.site_settings.save()
+            # Until commit, readers keep the old version instead of caching the old row under a new one
+            self.assertEqual(get_site_settings().site_name, "Before")
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_site_settings().site_name, "After")
+
+    def test_deleted_settings_are_not_served(self):
+        self.assertEqual(get_site_settings().site_name, "Before")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.site_settings.delete()
+        self.assertEqual(get_site_settings().site_name, "Marube Snipher Abel")
+
+
+class CardCacheTests(TestCase):
+    """Rendered cards are shared across listings until their object changes"""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Web")
+        self.project = Project.objects.create(title="Cached card", description="d", short_description="s")
+        self.project.categories.add(self.category)
+
+    def test_card_is_reused_across_filters(self):
+        self.assertContains(self.client.get(reverse('project_list')), "Cached card")
+        # A silent update leaves updated_at alone, so the stored card is served
+        Project.objects.filter(pk=self.project.pk).update(title="Silently renamed")
+        response = self.client.get(f"{reverse('project_list')}?category={self.category.slug}")
+        self.assertContains(response, "Cached card")
+
+        self.project.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.save()
+        self.assertContains(self.client.get(reverse('project_list')), "Silently renamed")
+
+    def test_relation_and_shared_object_changes_refresh_cards(self):
+        self.client.get(reverse('project_list'))
+        with self.captureOnCommitCallbacks(execute=True):
+            technology = Technology.objects.create(name="Rust")
+            self.project.technologies.add(technology)
+        self.assertContains(self.client.get(reverse('project_list')), "Rust")
+
+        technology.name = "Zig"
+        with self.captureOnCommitCallbacks(execute=True):
+            technology.save()
+        self.assertContains(self.client.get(reverse('project_list')), "Zig")
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConditionalGetTests(TestCase):
+    """Detail pages answer revalidation with 304 before doing any real work"""
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user('author')
+        self.post = BlogPost.objects.create(
+            title="Cached post", content="<p>Body</p>", author=author,
+            published=True, status='published',
+        )
+        self.url = self.post.get_absolute_url()
+        patcher = mock.patch('main.counters.record_view', return_value=1)
+        self.record_view = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unchanged_page_is_not_rendered_again(self):
+        response = self.client.get(self.url)
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1)
+        # The hit still counts even though the count is not part of the ETag
+        self.assertEqual(self.record_view.call_count, 2)
+
+        response = self.client.get(self.url, headers={'If-Modified-Since': response['Last-Modified']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_content_changes_move_the_validators(self):
+        etag = self.client.get(self.url)['ETag']
+        self.post.title = "Renamed post"
+        self.post.save()
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 200)
+
+        # Shared objects shown on the page, like the author, count too
+        etag = self.client.get(self.url)['ETag']
+        self.post.author.first_name = "Grace"
+        self.post.author.save()
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SitemapFeedTests(TestCase):
+    """Sitemaps and feeds list published content and are cached until it changes"""
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user('author', first_name='Ada', last_name='Writer')
+        self.category = Category.objects.create(name="Python")
+        self.empty_category = Category.objects.create(name="Empty")
+        self.post = BlogPost.objects.create(
+            title="Published post", content="<p>Body</p>", excerpt="Short", author=author,
+            published=True, status='published',
+        )
+        self.post.categories.add(self.category)
+        self.draft = BlogPost.objects.create(title="Draft post", content="<p>Body</p>", author=author)
+
+    def read(self, response):
+        return b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_index_and_sections(self):
+        index = self.client.get(reverse('sitemap')).content.decode()
+        for section in ('posts', 'projects', 'categories', 'tags'):
+            self.assertIn(reverse('sitemap_section', kwargs={'section': section}), index)
+
+        posts = self.read(self.client.get(reverse('sitemap_section', kwargs={'section': 'posts'}))).decode()
+        self.assertIn(self.post.get_absolute_url(), posts)
+        self.assertNotIn(self.draft.slug, posts)
+        categories = self.read(self.client.get(reverse('sitemap_section', kwargs={'section': 'categories'}))).decode()
+        self.assertIn(self.category.get_absolute_url(), categories)
+        self.assertNotIn(self.empty_category.get_absolute_url(), categories)
+        self.assertEqual(self.client.get(reverse('sitemap_section', kwargs={'section': 'nope'})).status_code, 404)
+
+    def test_streamed_section_is_cached_until_publish(self):
+        url = reverse('sitemap_section', kwargs={'section': 'posts'})
+        first = self.read(self.client.get(url))
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertEqual(response.content, first)
+
+        self.draft.published = True
+        self.draft.status = 'published'
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.draft.save()
+            # Until the save commits the cached copy stays, so it cannot be refilled with old rows
+            self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+        for callback in callbacks:
+            callback()
+        self.assertIn(self.draft.get_absolute_url().encode(), self.read(self.client.get(url)))
+
+    def test_feeds(self):
+        rss = self.client.get(reverse('post_feed_rss'))
+        self.assertContains(rss, "Published post")
+        self.assertContains(rss, "<category>Python</category>")
+        self.assertNotContains(rss, "Draft post")
+        atom = self.client.get(reverse('post_feed_atom'))
+        self.assertContains(atom, 'xmlns="http://www.w3.org/2005/Atom"')
+        self.assertContains(atom, "Ada Writer")
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AsyncHomeViewTests(TransactionTestCase):
+    """The async home page loads its sections side by side and renders once"""
+
+    def setUp(self):
+        SiteSettings.objects.create(site_name="Async Portfolio")
+        cache.clear()
+        project = Project.objects.create(
+            title="Featured project", description="d", short_description="s", featured=True
+        )
+        project.technologies.add(Technology.objects.create(name="Django"))
+
+    async def test_loaders_run_concurrently(self):
+        started = time.perf_counter()
+        results = await load_concurrently(
+            first=lambda: time.sleep(0.3) or 1,
+            second=lambda: time.sleep(0.3) or 2,
+        )
+        self.assertEqual(results, {'first': 1, 'second': 2})
+        self.assertLess(time.perf_counter() - started, 0.55)
+
+    async def test_loader_connections_are_closed(self):
+        def loader():
+            Project.objects.count()
+            return connections['default']
+
+        with mock.patch.dict(connection.settings_dict, {'CONN_MAX_AGE': 60}):
+            thread_connection = (await load_concurrently(projects=loader))['projects']
+        self.assertIsNone(thread_connection.connection)
+
+    async def test_renders_and_caches_home(self):
+        view = AsyncHomeView.as_view()
+        request = AsyncRequestFactory().get('/')
+        request.user = AnonymousUser()
+        request.auser = mock.AsyncMock(return_value=request.user)
+
+        response = await view(request)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertIn(b"Featured project", response.content)
+        self.assertIn(b"Django", response.content)
+        self.assertEqual((await view(request))['X-Page-Cache'], 'HIT')
+
+
+class QueryPatternTests(TestCase):
+    """Prefetched relations are counted without queries, and N+1 loops are reported"""
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = [Category.objects.create(name=f"Category {i}") for i in range(3)]
+        for i in range(4):
+            Project.objects.create(title=f"Project {i}", description="d", short_description="s").categories.set(categories)
+
+    def test_prefetch_aware_filters(self):
+        template = Template(
+            "{% load prefetch_tags %}{% for project in projects %}"
+            "{{ project.categories|related_count }}{{ project.technologies|has_related }} {% endfor %}"
+        )
+        projects = list(Project.objects.prefetch_related('categories', 'technologies'))
+        with self.assertNumQueries(0):
+            rendered = template.render(Context({'projects': projects}))
+        self.assertEqual(rendered, "3False " * 4)
+
+        # Without a prefetch each check falls back to one COUNT/EXISTS query
+        unprefetched = list(Project.objects.all()[:1])
+        with self.assertNumQueries(2):
+            template.render(Context({'projects': unprefetched}))
+
+    @override_settings(QUERY_PATTERN_DETECTION=True)
+    def test_middleware_reports_repeated_queries(self):
+        def view(request):
+            template = Template("{% for project in projects %}\n{{ project.categories.count }}{% endfor %}")
+            return HttpResponse(template.render(Context({'projects': Project.objects.all()})))
+
+        with self.assertLogs('main.middleware', 'WARNING') as logs:
+            response = QueryPatternMiddleware(view)(RequestFactory().get('/projects/'))
+        self.assertEqual(response['X-Repeated-Queries'], '1')
+        self.assertIn("query ran 4 times from <unknown source>:2", logs.output[0])
+
+    @override_settings(QUERY_PATTERN_DETECTION=True)
+    def test_middleware_leaves_lazy_objects_alone(self):
+        # A lazy object whose setup runs a query is a frame's ``self`` during that query
+        def view(request):
+            return HttpResponse(str(SimpleLazyObject(lambda: Project.objects.count())))
+
+        response = QueryPatternMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(response.content, b'4')
+
+    @override_settings(DEBUG=True, QUERY_PATTERN_DETECTION=False)
+    def test_middleware_is_off_unless_asked_for(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryPatternMiddleware(lambda request: HttpResponse())
+
+
+class ImageVariantTests(TestCase):
+    """Uploads are resized into AVIF/WebP variants and served with srcset"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = self.settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (1000, 500), 'teal').save(buffer, format='PNG')
+        with mock.patch('main.tasks.generate_image_variants.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.project = Project.objects.create(
+                    title="Pictured", description="d", short_description="s",
+                    featured_image=SimpleUploadedFile('shot.png', buffer.getvalue(), content_type='image/png'),
+                )
+        delay.assert_called_once_with('main.project', self.project.pk)
+
+    def test_variants_are_built_and_rendered(self):
+        with mock.patch('main.images.VARIANT_FORMATS', (('webp', {'quality': 80}),)):
+            built = generate_image_variants('main.project', self.project.pk)
+        self.assertEqual(built, {'featured_image': self.project.featured_image.name})
+
+        self.project.refresh_from_db()
+        entry = self.project.image_variants['featured_image']
+        self.assertEqual((entry['width'], entry['height']), (1000, 500))
+        self.assertEqual([width for width, _ in entry['variants']['webp']], [480, 800])
+
+        html = Template(
+            "{% load image_tags %}{% responsive_image project 'featured_image' alt='Shot' class='card' %}"
+        ).render(Context({'project': self.project}))
+        self.assertIn('<source type="image/webp" srcset="', html)
+        self.assertIn('-480.webp 480w', html)
+        self.assertIn('width="1000"', html)
+        self.assertIn('class="card"', html)
+
+    def build_variants(self):
+        with mock.patch('main.images.VARIANT_FORMATS', (('webp', {'quality': 80}),)):
+            generate_image_variants('main.project', self.project.pk)
+        self.project.refresh_from_db()
+        return [name for _, name in self.project.image_variants['featured_image']['variants']['webp']]
+
+    def test_replaced_image_variants_are_deleted(self):
+        old_variants = self.build_variants()
+        buffer = io.BytesIO()
+        Image.new('RGB', (600, 300), 'navy').save(buffer, format='PNG')
+        self.project.featured_image = SimpleUploadedFile('other.png', buffer.getvalue(), content_type='image/png')
+        with mock.patch('main.tasks.generate_image_variants.delay'):
+            self.project.save()
+
+        new_variants = self.build_variants()
+        self.assertFalse(any(default_storage.exists(name) for name in old_variants))
+        self.assertTrue(all(default_storage.exists(name) for name in new_variants))
+
+    def test_deleted_object_variants_are_deleted(self):
+        variants = self.build_variants()
+        self.assertTrue(all(default_storage.exists(name) for name in variants))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.delete()
+        self.assertFalse(any(default_storage.exists(name) for name in variants))
+
+    def test_plain_img_until_variants_exist(self):
+        html = Template(
+            "{% load image_tags %}{% responsive_image project 'featured_image' alt='Shot' %}"
+        ).render(Context({'project': self.project}))
+        self.assertTrue(html.startswith('<img'))
+        self.assertNotIn('srcset', html)
+
+
+@override_settings(
+    DEBUG=False,
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+    },
+    STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+)
+class StaticAssetTests(TestCase):
+    """Collected assets get hashed names, compressed copies and immutable caching"""
+
+    def setUp(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        override = self.settings(STATIC_ROOT=static_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_hashed_asset_is_served_compressed_and_immutable(self):
+        url = static('css/code-styles.css')
+        self.assertRegex(url, r'/css/code-styles\.[0-9a-f]{12}\.css$')
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
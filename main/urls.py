@@ -1,15 +1,25 @@
+from django.conf import settings
 from django.urls import path
 from . import views
+from .feeds import latest_posts_atom, latest_posts_rss
+from .sitemaps import sitemap_index, sitemap_section
 
 urlpatterns = [
-    path('', views.HomeView.as_view(), name='home'),
+    path('', (views.AsyncHomeView if settings.ASYNC_HOME_VIEW else views.HomeView).as_view(), name='home'),
     path('projects/', views.ProjectListView.as_view(), name='project_list'),
     path('projects/<slug:slug>/', views.ProjectDetailView.as_view(), name='project_detail'),
     path('blog/', views.BlogListView.as_view(), name='blog_list'),
+    path('blog/feed/rss/', latest_posts_rss, name='post_feed_rss'),
+    path('blog/feed/atom/', latest_posts_atom, name='post_feed_atom'),
     path('blog/<slug:slug>/', views.BlogDetailView.as_view(), name='blog_detail'),
     path('coffee/', views.CoffeePurchaseView.as_view(), name='buy_coffee'),
     path('coffee/thankyou/', views.coffee_thankyou, name='coffee_thankyou'),
+    path('coffee/pending/<uuid:reference>/', views.coffee_pending, name='coffee_pending'),
+    path('coffee/status/<uuid:reference>/', views.coffee_status, name='coffee_status'),
+    path('coffee/webhook/', views.coffee_webhook, name='coffee_webhook'),
     path('category/<slug:slug>/', views.category_posts, name='category_posts'),
     path('tag/<slug:slug>/', views.tag_posts, name='tag_posts'),
     path('contact/', views.contact_view, name='contact'),
+    path('sitemap.xml', sitemap_index, name='sitemap'),
+    path('sitemap-<slug:section>.xml', sitemap_section, name='sitemap_section'),
 ]
\ No newline at end of file
@@ -1,51 +1,159 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.views.generic import ListView, DetailView, CreateView
+from django.views.generic import ListView, DetailView, CreateView, View
+from django.conf import settings
 from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.db import close_old_connections, connections, transaction
 from django.utils import timezone
-from django.db.models import Q, Count
 from django.http import JsonResponse, Http404
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
+from asgiref.sync import sync_to_async
+import asyncio
+import json
 import logging
 
-from .models import Project, BlogPost, CoffeePurchase, Category, Tag, SiteSettings, Technology
+from .models import Project, BlogPost, CoffeePurchase, Category, Tag, Technology
 from .forms import CoffeePurchaseForm
+from .cache import (
+    CSRF_PLACEHOLDER, PAGE_CACHE_TIMEOUT, CachedPageMixin, ConditionalDetailMixin,
+    cached_page_response, get_site_settings, page_cache_key,
+)
+from .pagination import CursorPaginationMixin
+from .search import search_posts, search_projects
+from .related import get_related
+from .payments import PaymentResult, finalize_payment, verify_signature
+from .tasks import process_coffee_payment
+from . import counters
 
 logger = logging.getLogger(__name__)
 
 
-class HomeView(ListView):
+def featured_projects():
+    return list(Project.objects.filter(
+        featured=True, 
+        status='completed'
+    ).prefetch_related('technologies', 'categories')[:6])
+
+
+def recent_posts():
+    return list(BlogPost.objects.filter(
+        published=True, 
+        status='published'
+    ).select_related('author').prefetch_related('categories', 'tags')[:3])
+
+
+def stack_technologies():
+    """Technologies used by at least one project, most used first"""
+    return list(Technology.objects.filter(project_count__gt=0).order_by('-project_count', 'name'))
+
+
+class HomeView(CachedPageMixin, ListView):
     """Optimized home view with featured content"""
     template_name = 'main/index.html'
     context_object_name = 'featured_content'
     
     def get_queryset(self):
-        """Get featured projects and blog posts in a single query"""
         return {
-            'featured_projects': Project.objects.filter(
-                featured=True, 
-                status='completed'
-            ).select_related().prefetch_related('technologies', 'categories')[:6],
-            'recent_posts': BlogPost.objects.filter(
-                published=True, 
-                status='published'
-            ).select_related('author').prefetch_related('categories', 'tags')[:3]
+            'featured_projects': featured_projects(),
+            'recent_posts': recent_posts(),
         }
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['site_settings'] = SiteSettings.load()
+        context['technologies'] = stack_technologies()
         return context
 
 
-class ProjectListView(ListView):
+def run_with_own_connection(loader):
+    """
+    Run a loader on a worker thread with that thread's own DB connection.
+
+    Worker threads never see request_started/finished, and an idle pool
+    thread would otherwise hold its connection open for CONN_MAX_AGE, so
+    the connection is closed (or handed back to the pool) once the loader
+    is done.
+    """
+    close_old_connections()
+    try:
+        return loader()
+    finally:
+        connections.close_all()
+
+
+async def load_concurrently(**loaders):
+    """
+    Run blocking loaders at the same time and return their results by name.
+
+    The async ORM runs every query on the request's single sync thread, so
+    gathering its coroutines still executes them one after another. Each
+    loader gets its own thread (and so its own connection) instead.
+    """
+    results = await asyncio.gather(*(
+        sync_to_async(run_with_own_connection, thread_sensitive=False)(loader)
+        for loader in loaders.values()
+    ))
+    return dict(zip(loaders, results))
+
+
+class AsyncHomeView(View):
+    """
+    Home page for ASGI deployments (see ``ASYNC_HOME_VIEW``).
+
+    Featured projects, recent posts, the technology list and the site
+    settings are fetched concurrently and the page is rendered once, so a
+    cache miss takes as long as the slowest query rather than their sum.
+    Shares the anonymous page cache with the other listings.
+    """
+    template_name = 'main/index.html'
+    
+    async def get(self, request, *args, **kwargs):
+        cache_key = None
+        if not request.GET and not (await request.auser()).is_authenticated:
+            cache_key = await sync_to_async(page_cache_key)(self.__class__.__name__, request)
+            cached = await cache.aget(cache_key)
+            if cached is not None:
+                content, content_type = cached
+                return cached_page_response(request, content, content_type, 'HIT')
+        
+        data = await load_concurrently(
+            featured_projects=featured_projects,
+            recent_posts=recent_posts,
+            technologies=stack_technologies,
+            site_settings=get_site_settings,
+        )
+        context = {
+            'featured_content': {
+                'featured_projects': data['featured_projects'],
+                'recent_posts': data['recent_posts'],
+            },
+            'technologies': data['technologies'],
+            'site_settings': data['site_settings'],
+        }
+        if cache_key is None:
+            return await sync_to_async(render)(request, self.template_name, context)
+        
+        context['csrf_token'] = CSRF_PLACEHOLDER
+        response = await sync_to_async(render)(request, self.template_name, context)
+        await cache.aset(cache_key, (response.content, response['Content-Type']), PAGE_CACHE_TIMEOUT)
+        return cached_page_response(request, response.content, response['Content-Type'], 'MISS')
+
+
+class ProjectListView(CachedPageMixin, CursorPaginationMixin, ListView):
     """Professional project listing with filtering and search"""
     model = Project
     template_name = 'main/projects.html'
     context_object_name = 'projects'
     paginate_by = 9
+    cursor_ordering = ('display_order', '-created_at', '-id')
+    cache_vary_params = ('q', 'category', 'technology', 'sort', 'page', 'cursor')
+    
+    def use_cursor_pagination(self):
+        # Search results are ordered by relevance, which has no stable keyset
+        return not self.request.GET.get('q')
     
     def get_queryset(self):
         queryset = Project.objects.filter(status='completed').select_related().prefetch_related(
@@ -65,27 +173,18 @@ class ProjectListView(ListView):
         # Search functionality
         search_query = self.request.GET.get('q')
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(short_description__icontains=search_query) |
-                Q(technologies__name__icontains=search_query)
-            ).distinct()
+            return search_projects(queryset, search_query)
         
-        return queryset.order_by('display_order', '-created_at')
+        return queryset.order_by('display_order', '-created_at', '-id')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.annotate(
-            project_count=Count('projects')
-        ).filter(project_count__gt=0)
-        context['technologies'] = Technology.objects.annotate(
-            project_count=Count('projects')
-        ).filter(project_count__gt=0)
+        context['categories'] = Category.objects.filter(project_count__gt=0)
+        context['technologies'] = Technology.objects.filter(project_count__gt=0)
         return context
 
 
-class ProjectDetailView(DetailView):
+class ProjectDetailView(ConditionalDetailMixin, DetailView):
     """Project detail view with related projects"""
     model = Project
     template_name = 'main/project_detail.html'
@@ -98,25 +197,27 @@ class ProjectDetailView(DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        project = self.get_object()
-        
-        # Get related projects (same categories or technologies)
-        related_projects = Project.objects.filter(
-            Q(categories__in=project.categories.all()) |
-            Q(technologies__in=project.technologies.all()),
-            status='completed'
-        ).exclude(pk=project.pk).distinct()[:4]
+        project = self.object
         
-        context['related_projects'] = related_projects
+        # Get related projects (precomputed from shared categories and technologies)
+        context['related_projects'] = get_related(
+            project, Project.objects.filter(status='completed'), limit=4
+        )
         return context
 
 
-class BlogListView(ListView):
+class BlogListView(CachedPageMixin, CursorPaginationMixin, ListView):
     """Enhanced blog list view with filtering, search, and pagination"""
     model = BlogPost
     template_name = 'main/blog.html'
     context_object_name = 'posts'
     paginate_by = 9
+    cursor_ordering = ('-published_at', '-id')
+    cache_vary_params = ('q', 'category', 'tag', 'author', 'page', 'cursor')
+    
+    def use_cursor_pagination(self):
+        # Search results are ordered by relevance, which has no stable keyset
+        return not self.request.GET.get('q')
     
     def get_queryset(self):
         queryset = BlogPost.objects.filter(
@@ -143,27 +244,19 @@ class BlogListView(ListView):
         # Search functionality
         search_query = self.request.GET.get('q')
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(content__icontains=search_query) |
-                Q(excerpt__icontains=search_query) |
-                Q(tags__name__icontains=search_query)
-            ).distinct()
+            return search_posts(queryset, search_query)
         
-        return queryset.order_by('-published_at', '-created_at')
+        return queryset.order_by('-published_at', '-id')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.annotate(
-            post_count=Count('blog_posts')
-        ).filter(post_count__gt=0)
-        context['popular_tags'] = Tag.objects.annotate(
-            post_count=Count('blog_posts')
-        ).filter(post_count__gt=0).order_by('-post_count')[:10]
+        context['categories'] = Category.objects.filter(post_count__gt=0)
+        context['popular_tags'] = Tag.objects.filter(post_count__gt=0).order_by('-post_count')[:10]
+        counters.attach_pending_views(context['posts'])
         return context
 
 
-class BlogDetailView(DetailView):
+class BlogDetailView(ConditionalDetailMixin, DetailView):
     """Blog detail view with view counting and related posts"""
     model = BlogPost
     template_name = 'main/blog_detail.html'
@@ -178,31 +271,35 @@ class BlogDetailView(DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        post = self.get_object()
+        post = self.object
         
-        # Get related posts (same categories or tags)
-        related_posts = BlogPost.objects.filter(
-            Q(categories__in=post.categories.all()) |
-            Q(tags__in=post.tags.all()),
-            published=True,
-            status='published'
-        ).exclude(pk=post.pk).distinct()[:3]
-        
-        context['related_posts'] = related_posts
+        # Get related posts (precomputed from shared categories and tags)
+        context['related_posts'] = get_related(
+            post, BlogPost.objects.filter(published=True, status='published'), limit=3
+        )
         return context
     
+    def record_view(self, post):
+        """Count the view in the buffered counter"""
+        try:
+            post.pending_views = counters.record_view(post.pk)
+        except Exception as e:
+            logger.error(f"Error buffering view count for post {post.pk}: {e}")
+            post.increment_view_count()
+    
     def get(self, request, *args, **kwargs):
-        """Increment view count when post is viewed"""
+        """Count the view when post is viewed"""
         response = super().get(request, *args, **kwargs)
         
         # Only increment for actual views (not previews, etc.)
         if self.object.is_published:
-            try:
-                self.object.increment_view_count()
-            except Exception as e:
-                logger.error(f"Error incrementing view count for post {self.object.pk}: {e}")
+            self.record_view(self.object)
         
         return response
+    
+    def not_modified(self, post):
+        # A revalidated page is still a view; the count is not in the ETag
+        self.record_view(post)
 
 
 class CoffeePurchaseView(CreateView):
@@ -214,7 +311,6 @@ class CoffeePurchaseView(CreateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['site_settings'] = SiteSettings.load()
         context['recent_supporters'] = CoffeePurchase.objects.filter(
             is_paid=True, 
             public_message=True
@@ -222,7 +318,7 @@ class CoffeePurchaseView(CreateView):
         return context
     
     def form_valid(self, form):
-        """Handle form validation and payment processing"""
+        """Save the pending purchase and hand payment processing to Celery"""
         try:
             # Add IP address and user agent
             if self.request.META.get('HTTP_X_FORWARDED_FOR'):
@@ -236,56 +332,53 @@ class CoffeePurchaseView(CreateView):
             # Save the purchase instance
             self.object = form.save()
             
-            # Process payment (implement your payment gateway here)
-            payment_success = self.process_payment(self.object)
-            
-            if payment_success:
-                messages.success(self.request, 
-                    f"Thank you for your coffee! Your support means a lot. ☕")
-                return super().form_valid(form)
-            else:
-                messages.error(self.request,
-                    "Payment processing failed. Please try again or contact support.")
-                return self.form_invalid(form)
+            # Charge in the background; the pending page polls for the result
+            purchase_id = self.object.pk
+            transaction.on_commit(lambda: process_coffee_payment.delay(purchase_id))
+            return redirect('coffee_pending', reference=self.object.reference)
                 
         except Exception as e:
             logger.error(f"Error processing coffee purchase: {e}")
             messages.error(self.request,
                 "An error occurred while processing your request. Please try again.")
             return self.form_invalid(form)
+
+
+def coffee_pending(request, reference):
+    """Waiting page shown while the payment is processed"""
+    purchase = get_object_or_404(CoffeePurchase, reference=reference)
+    if purchase.is_paid:
+        return redirect(f"{reverse('coffee_thankyou')}?ref={purchase.reference}")
+    return render(request, 'main/coffee_pending.html', {'purchase': purchase})
+
+
+@require_http_methods(["GET"])
+def coffee_status(request, reference):
+    """Lightweight JSON payment status polled by the pending page"""
+    status = CoffeePurchase.objects.filter(reference=reference).values('payment_status', 'is_paid').first()
+    if status is None:
+        raise Http404("Unknown purchase")
     
-    def process_payment(self, purchase):
-        """
-        Implement your payment gateway integration here
-        This is a placeholder for M-Pesa, PayPal, etc.
-        """
-        try:
-            # TODO: Integrate with your payment provider
-            # For demonstration, mark as paid after 2 seconds
-            import time
-            time.sleep(2)  # Simulate payment processing
-            
-            # Simulate successful payment
-            purchase.mark_as_paid(
-                transaction_id=f"TXN_{purchase.id}_{int(time.time())}",
-                mpesa_code=f"MPE{purchase.id}"
-            )
-            return True
-            
-        except Exception as e:
-            logger.error(f"Payment processing error for purchase {purchase.id}: {e}")
-            return False
+    data = {'status': status['payment_status'], 'is_paid': status['is_paid']}
+    if status['is_paid']:
+        data['redirect'] = f"{reverse('coffee_thankyou')}?ref={reference}"
+    response = JsonResponse(data)
+    response['Cache-Control'] = 'no-store'
+    return response
 
 
 def coffee_thankyou(request):
-    """Thank you page for coffee purchases"""
-    recent_purchase = CoffeePurchase.objects.filter(
-        is_paid=True
-    ).order_by('-created_at').first()
+    """Thank you page for coffee purchases; only the buyer's own ``?ref`` shows its details"""
+    purchase = None
+    reference = request.GET.get('ref')
+    if reference:
+        try:
+            purchase = CoffeePurchase.objects.filter(is_paid=True, reference=reference).first()
+        except ValidationError:
+            pass
     
     context = {
-        'purchase': recent_purchase,
-        'site_settings': SiteSettings.load()
+        'purchase': purchase,
     }
     return render(request, 'main/coffee_thankyou.html', context)
 
@@ -298,12 +391,11 @@ def category_posts(request, slug):
         categories=category,
         published=True,
         status='published'
-    ).select_related('author').prefetch_related('tags')
+    ).select_related('author')
     
     context = {
         'category': category,
         'posts': posts,
-        'site_settings': SiteSettings.load()
     }
     return render(request, 'main/category_posts.html', context)
 
@@ -316,12 +408,11 @@ def tag_posts(request, slug):
         tags=tag,
         published=True,
         status='published'
-    ).select_related('author').prefetch_related('categories')
+    ).select_related('author')
     
     context = {
         'tag': tag,
         'posts': posts,
-        'site_settings': SiteSettings.load()
     }
     return render(request, 'main/tag_posts.html', context)
 
@@ -331,22 +422,26 @@ def tag_posts(request, slug):
 def coffee_webhook(request):
     """
     Webhook endpoint for payment gateway callbacks
-    Implement based on your payment provider's requirements
+    Expects a signed JSON body: {"reference", "status", "transaction_id", "mpesa_code"}
     """
+    if not settings.PAYMENT_WEBHOOK_SECRET:
+        logger.error("Refusing payment webhook: PAYMENT_WEBHOOK_SECRET is not set")
+        return JsonResponse({'status': 'error', 'message': 'Webhooks are not configured'}, status=503)
+    if not verify_signature(request.body, request.headers.get('X-Signature')):
+        return JsonResponse({'status': 'error', 'message': 'Invalid signature'}, status=403)
+    
     try:
-        # TODO: Implement webhook logic for your payment provider
-        # This is a placeholder for M-Pesa, PayPal webhooks
-        
-        # Example structure:
-        # transaction_id = request.POST.get('transaction_id')
-        # status = request.POST.get('status')
-        
-        # if status == 'completed':
-        #     purchase = CoffeePurchase.objects.get(transaction_id=transaction_id)
-        #     purchase.mark_as_paid()
-        
+        payload = json.loads(request.body)
+        result = PaymentResult(
+            status=payload['status'],
+            transaction_id=payload.get('transaction_id', ''),
+            mpesa_code=payload.get('mpesa_code', ''),
+        )
+        finalize_payment(payload['reference'], result)
         return JsonResponse({'status': 'success'})
-        
+    
+    except CoffeePurchase.DoesNotExist:
+        return JsonResponse({'status': 'error', 'message': 'Unknown purchase'}, status=404)
     except Exception as e:
         logger.error(f"Webhook error: {e}")
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
@@ -371,5 +466,5 @@ def contact_view(request):
         return redirect('home')
     
     # If it's a GET request, redirect to home with contact section anchor
-    return redirect('home' + '#contact')
+    return redirect(reverse('home') + '#contact')
 
@@ -0,0 +1,7 @@
+from django.contrib.staticfiles.apps import StaticFilesConfig
+
+
+class PortfolioStaticFilesConfig(StaticFilesConfig):
+    # css/input.css is the Tailwind build source (compiled into output.css)
+    # and media/ holds uploads; neither belongs in the collected assets
+    ignore_patterns = StaticFilesConfig.ignore_patterns + ['css/input.css', 'media']